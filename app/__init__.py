@@ -1,5 +1,22 @@
 from flask import Flask
 from app.api.routes import api
+from app.config import PRELOAD_MODELS
+from app.core.model_registry import MODEL_REGISTRY
+from app.utils.temp_gc import collect_temp_garbage
 
-app = Flask(__name__)
-app.register_blueprint(api)
\ No newline at end of file
+
+def create_app() -> Flask:
+    """
+    Builds the Flask app and prepares the process to serve it. Servers call it once at startup
+    (gunicorn -c gunicorn.conf.py "app:create_app()", run.py); importing the package has no
+    side effects, so scripts and tools don't clear the temp folder or load the models.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(api)
+
+    # Clear temp files left behind by previous runs
+    collect_temp_garbage()
+
+    # Warm startup: load configured models before the first request
+    MODEL_REGISTRY.preload(PRELOAD_MODELS)
+    return app
@@ -1,9 +1,11 @@
 from flask import request, jsonify, Blueprint
 from app.services.processing_functions import process_domains, process_html
 from app.services.single_image_classification import classify_image
-from app.core.image_models import MobileViTClassifier
+from app.core.model_registry import MODEL_REGISTRY, get_model
 from app.config import ERROR_MESSAGES, DEFAULT_OUTPUT_TYPE
 from app.services.process_domains_moondream import process_domains_moondream_service
+from app.services.jobs import get_job_manager
+from app.core.result_cache import get_result_cache
 
 # Create blueprint
 api = Blueprint('api', __name__)
@@ -14,6 +16,16 @@ def health_check():
     return jsonify({'status': 'ok'}), 200
 
 
+@api.route('/models/stats', methods=['GET'])
+def models_stats():
+    return jsonify(MODEL_REGISTRY.stats()), 200
+
+
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_result_cache().stats()), 200
+
+
 @api.route('/model/<model_name>', methods=['POST'])
 def model_classification(model_name):
     try:
@@ -60,7 +72,7 @@ def process_html_endpoint():
         if not html:
             return jsonify({'error': ERROR_MESSAGES['NO_HTML_CONTENT']}), 400
         
-        model = MobileViTClassifier()
+        model = get_model('mobilevit_v2')
         
         result = process_html(html, base_url, model)
         return jsonify(result), 200
@@ -79,3 +91,49 @@ def process_domains_moondream_endpoint():
         return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+
+
+@api.route('/jobs/process-domains-moondream', methods=['POST'])
+def submit_process_domains_moondream_job():
+    """
+    Same payload as /process-domains-moondream, but returns a job id right away
+    and runs the pipeline in the background.
+    """
+    try:
+        input_data = request.json
+        categories = input_data.get('categories')
+        html = input_data.get('data')
+        job_id = get_job_manager().submit(
+            'process-domains-moondream', process_domains_moondream_service, html, categories
+        )
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        return jsonify({'error': ERROR_MESSAGES['JOB_NOT_FOUND']}), 404
+
+    return jsonify({
+        key: job[key]
+        for key in ('job_id', 'kind', 'status', 'progress', 'error', 'created_at', 'started_at', 'finished_at')
+    }), 200
+
+
+@api.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """Final stats once the job is done, otherwise the stats of the images processed so far."""
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        return jsonify({'error': ERROR_MESSAGES['JOB_NOT_FOUND']}), 404
+
+    done = job['status'] == 'done'
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'partial': not done,
+        'result': job['result'] if done else job['partial_result'],
+    }), 200
@@ -4,10 +4,43 @@ from .constants import (
     SUPPORTED_IMAGE_FORMATS,
     DEFAULT_OUTPUT_TYPE,
     DEFAULT_DB_LIMIT,
+    MAX_IMAGE_SIZE_BYTES,
+    DOWNLOAD_TIMEOUT,
+    DOWNLOAD_MAX_CONCURRENCY,
+    DOWNLOAD_MAX_PER_HOST,
+    PREFILTER_MIN_DIMENSION,
+    PREFILTER_KEYWORDS,
+    PREFILTER_TRACKING_HOSTS,
+    PREFILTER_PROBE,
+    PREFILTER_PROBE_BYTES,
+    HTML_PARSER_ENGINE,
+    HTML_PARSE_CACHE_MAX_ENTRIES,
+    HTML_PARSE_PROCESSES,
+    HTML_PARSE_CHUNK_SIZE,
+    IMAGE_DECODE_BACKEND,
+    IMAGE_RESAMPLE,
+    IMAGE_DECODE_PROCESSES,
+    HOSTED_IMAGE_OPTIONS,
+    HOSTED_PAYLOAD_CACHE_MAX_BYTES,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_CACHE_REVALIDATE_AFTER,
+    TEMP_GC_MAX_AGE,
+    TEMP_GC_MIN_AGE,
+    TEMP_GC_MAX_BYTES,
+    TEMP_GC_INTERVAL,
+    RESULT_CACHE_BACKEND,
+    RESULT_CACHE_MAX_ENTRIES,
+    JOB_MAX_CONCURRENCY,
+    PIPELINE_WORKERS,
+    PIPELINE_QUEUE_SIZES,
 )
 from .config import (
     TEMP_IMAGE_DIR,
-    IMAGE_DIR
+    IMAGE_DIR,
+    IMAGE_CACHE_DIR,
+    RESULT_CACHE_PATH,
+    PRELOAD_MODELS,
+    JOB_STORE_PATH
 )
 
 from .models import MODEL_CLASSES
@@ -17,8 +50,41 @@ __all__ = [
     'SUPPORTED_IMAGE_FORMATS',
     'DEFAULT_OUTPUT_TYPE',
     'DEFAULT_DB_LIMIT',
+    'MAX_IMAGE_SIZE_BYTES',
+    'DOWNLOAD_TIMEOUT',
+    'DOWNLOAD_MAX_CONCURRENCY',
+    'DOWNLOAD_MAX_PER_HOST',
+    'PREFILTER_MIN_DIMENSION',
+    'PREFILTER_KEYWORDS',
+    'PREFILTER_TRACKING_HOSTS',
+    'PREFILTER_PROBE',
+    'PREFILTER_PROBE_BYTES',
+    'HTML_PARSER_ENGINE',
+    'HTML_PARSE_CACHE_MAX_ENTRIES',
+    'HTML_PARSE_PROCESSES',
+    'HTML_PARSE_CHUNK_SIZE',
+    'IMAGE_DECODE_BACKEND',
+    'IMAGE_RESAMPLE',
+    'IMAGE_DECODE_PROCESSES',
+    'HOSTED_IMAGE_OPTIONS',
+    'HOSTED_PAYLOAD_CACHE_MAX_BYTES',
+    'IMAGE_CACHE_MAX_BYTES',
+    'IMAGE_CACHE_REVALIDATE_AFTER',
+    'TEMP_GC_MAX_AGE',
+    'TEMP_GC_MIN_AGE',
+    'TEMP_GC_MAX_BYTES',
+    'TEMP_GC_INTERVAL',
+    'RESULT_CACHE_BACKEND',
+    'RESULT_CACHE_MAX_ENTRIES',
+    'JOB_MAX_CONCURRENCY',
+    'PIPELINE_WORKERS',
+    'PIPELINE_QUEUE_SIZES',
     'ERROR_MESSAGES',
     'TEMP_IMAGE_DIR',
     'IMAGE_DIR',
+    'IMAGE_CACHE_DIR',
+    'RESULT_CACHE_PATH',
+    'PRELOAD_MODELS',
+    'JOB_STORE_PATH',
     'MODEL_CLASSES'
 ] 
\ No newline at end of file
@@ -7,6 +7,17 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Image directories
 IMAGE_DIR = os.path.join(BASE_DIR, 'data', 'images')
 TEMP_IMAGE_DIR = os.path.join(IMAGE_DIR, 'temp')
+IMAGE_CACHE_DIR = os.path.join(IMAGE_DIR, 'cache')
+
+# Classification result cache (used by the 'sqlite' backend)
+RESULT_CACHE_PATH = os.path.join(BASE_DIR, 'data', 'cache', 'results.sqlite3')
+
+# Background job records (status, progress, results)
+JOB_STORE_PATH = os.path.join(BASE_DIR, 'data', 'jobs', 'jobs.sqlite3')
+
+# Models loaded at app startup, e.g. PRELOAD_MODELS=mobilevit_v2,moondream
+PRELOAD_MODELS = [name.strip() for name in os.getenv('PRELOAD_MODELS', '').split(',') if name.strip()]
 
 # Ensure directories exist
-os.makedirs(TEMP_IMAGE_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(TEMP_IMAGE_DIR, exist_ok=True)
+os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
\ No newline at end of file
@@ -1,6 +1,6 @@
 # Image Processing Constants
 TARGET_IMAGE_SIZE = (512, 512)
-SUPPORTED_IMAGE_FORMATS = ['jpg', 'jpeg', 'png']
+SUPPORTED_IMAGE_FORMATS = ['jpg', 'jpeg', 'png', 'webp']
 
 # API Response Messages
 ERROR_MESSAGES = {
@@ -8,11 +8,77 @@ ERROR_MESSAGES = {
     'NO_FILE_SELECTED': 'No selected file',
     'NO_HTML_CONTENT': 'No HTML content provided',
     'INVALID_MODEL': lambda available: f"Model not found. Available models: {available}",
-    'ENV_ERROR': 'OPENAI_API_KEY is not set or empty in the environment variables'
+    'ENV_ERROR': 'OPENAI_API_KEY is not set or empty in the environment variables',
+    'JOB_NOT_FOUND': 'Job not found'
 }
 
 # Default Processing Options
 DEFAULT_OUTPUT_TYPE = 'detailed'
 DEFAULT_DB_LIMIT = 250
 
+# Image Download Options
+MAX_IMAGE_SIZE_BYTES = 10 * 1024 * 1024  # 10MB limit per image
+DOWNLOAD_TIMEOUT = (5, 15)  # (connect timeout, read timeout) in seconds
+DOWNLOAD_MAX_CONCURRENCY = 64  # open connections across all hosts
+DOWNLOAD_MAX_PER_HOST = 8  # open connections to a single host
+
+# Pre-download Filter (drops icons, sprites and tracking pixels before they are downloaded)
+PREFILTER_MIN_DIMENSION = 100  # images declared or probed smaller than this (px, either side) are skipped
+PREFILTER_KEYWORDS = ('icon', 'icons', 'favicon', 'sprite', 'sprites', 'logo', 'avatar', 'badge',
+                      'emoji', 'spinner', 'loader', 'placeholder', 'spacer')  # words in class, alt or file name
+PREFILTER_TRACKING_HOSTS = ('facebook.com', 'doubleclick.net', 'google-analytics.com', 'googletagmanager.com',
+                            'bat.bing.com', 'analytics.twitter.com', 'px.ads.linkedin.com', 'ct.pinterest.com')
+PREFILTER_PROBE = True  # read the dimensions from the first bytes of each download and abort too small images
+PREFILTER_PROBE_BYTES = 16 * 1024  # bytes read before giving up on the header; enough for the JPEG SOF behind a typical EXIF block
+
+# HTML Parsing Options
+HTML_PARSER_ENGINE = 'lxml'  # 'lxml' (streaming, no tree), 'selectolax' (needs selectolax) or 'bs4'
+HTML_PARSE_CACHE_MAX_ENTRIES = 50_000  # pages whose <img> tags are kept in memory by HTML hash
+HTML_PARSE_PROCESSES = 4  # worker processes parsing pages in parallel; 0 or 1 parses in the calling process
+HTML_PARSE_CHUNK_SIZE = 8  # pages sent to a parse worker at once
+
+# Image Decoding Options
+IMAGE_DECODE_BACKEND = 'pil'  # 'pil' (draft-mode JPEG decoding) or 'opencv' (needs opencv-python-headless)
+IMAGE_RESAMPLE = 'bilinear'  # resize filter; the models' own preprocessors resize again afterwards
+IMAGE_DECODE_PROCESSES = 0  # >0 decodes in that many worker processes (pixels return via shared memory), 0 uses threads
+
+# Hosted VLM Image Options (images are downscaled and re-encoded before upload)
+HOSTED_IMAGE_OPTIONS = {
+    'max_side': 1024,      # longest side in pixels, aspect ratio is kept
+    'image_format': 'jpeg', # 'jpeg' or 'webp'
+    'quality': 85,
+    'grayscale': False,    # True sends single-channel images
+}
+HOSTED_PAYLOAD_CACHE_MAX_BYTES = 256 * 1024 * 1024  # prepared payloads kept in memory, per process
+
+# Image Cache Options
+IMAGE_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024  # 5GB on-disk budget, evicted LRU
+IMAGE_CACHE_REVALIDATE_AFTER = 24 * 60 * 60  # seconds before a cached URL is revalidated with the server
+
+# Temp Folder Garbage Collection
+TEMP_GC_MAX_AGE = 6 * 60 * 60  # seconds before a request's temp file is deleted
+TEMP_GC_MIN_AGE = 15 * 60  # files younger than this may belong to a running request and are kept
+TEMP_GC_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB of temp files not backed by the image cache
+TEMP_GC_INTERVAL = 5 * 60  # seconds between two collections
+
+# Result Cache Options
+RESULT_CACHE_BACKEND = 'sqlite'  # 'memory' (per-process LRU) or 'sqlite' (on disk, shared across processes)
+RESULT_CACHE_MAX_ENTRIES = 500_000
+
+# Streaming Pipeline Options (parse -> download -> decode -> infer)
+PIPELINE_WORKERS = {
+    'parse': max(2, HTML_PARSE_PROCESSES),  # HTML pages parsed at once; at least one per parse process
+    'download': 64,  # images downloaded at once (also capped per host by DOWNLOAD_MAX_PER_HOST)
+    'decode': 4,     # images decoded and resized at once
+}
+PIPELINE_QUEUE_SIZES = {
+    'urls': 512,       # parsed image URLs waiting for a download worker
+    'downloaded': 128, # downloaded files waiting to be decoded
+    'decoded': 64,     # decoded images waiting to be batched
+    'batches': 4,      # batches waiting for the model
+}
+
+# Background Job Options
+JOB_MAX_CONCURRENCY = 1  # jobs running at once per gunicorn worker (not server-wide); the rest wait in its queue
+
 # there is some stuff in the code that is hardcoded, you can add it here (as inspiration)
\ No newline at end of file
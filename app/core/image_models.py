@@ -9,14 +9,19 @@ from PIL import Image
 import litellm
 import torch
 
-import json
 import asyncio
+import logging
 
 from app.utils import prepare_image
+from app.core.result_cache import get_result_cache, hash_image
+from app.core.inference_executor import InferenceExecutor
+from app.core.request_scheduler import get_request_scheduler
 from app.core.response_validation import (
     ImagePrompts,
     MoondreamPrompts,
-    get_classes_with_nltk
+    get_classes_with_nltk,
+    extract_json,
+    validate_prediction
 )
 
 # Models that you can plug into litellm and directly use in the codebase
@@ -36,16 +41,42 @@ LLMS = {
     'FIREWORKS_QWEN': 'fireworks_ai/accounts/fireworks/models/qwen2-vl-72b-instruct',
 }
 
+# Token-bucket rate limits per provider (the prefix of the model paths in LLMS).
+# Requests to one provider share a scheduler, whatever model or request they come from.
+LLM_RATE_LIMITS = {
+    'openai': {'requests_per_second': 8, 'burst': 16},
+    'fireworks_ai': {'requests_per_second': 4, 'burst': 8},
+}
+
+# Re-requests of an image whose answer doesn't validate against its schema
+MAX_INVALID_RESPONSE_RETRIES = 2
+
+# Images per vision-encoder forward pass. The T4 (16GB) fits far larger batches than a
+# 4 vCPU node, where bigger batches only add latency without adding throughput.
+MOONDREAM_ENCODE_BATCH_SIZES = {
+    'cuda': 16,
+    'cpu': 4,
+}
+
+# (image, question) pairs per padded text-model batch
+MOONDREAM_DECODE_BATCH_SIZES = {
+    'cuda': 32,
+    'cpu': 8,
+}
+
 class MobileViTClassifier:
-    def __init__(self):
+    MODEL_ID = "shehan97/mobilevitv2-1.0-imagenet1k-256"
+
+    def __init__(self, result_cache=None):
         self.feature_extractor, self.model = self._load_model_and_processor()
+        self.result_cache = result_cache if result_cache is not None else get_result_cache()
     
     def _load_model_and_processor(self):
         """
         Loads and returns the MobileViTV2 model and feature extractor
         """
-        feature_extractor = MobileViTImageProcessor.from_pretrained("shehan97/mobilevitv2-1.0-imagenet1k-256")
-        model = MobileViTV2ForImageClassification.from_pretrained("shehan97/mobilevitv2-1.0-imagenet1k-256")
+        feature_extractor = MobileViTImageProcessor.from_pretrained(self.MODEL_ID)
+        model = MobileViTV2ForImageClassification.from_pretrained(self.MODEL_ID)
         return feature_extractor, model
     
     def predict(self, image):
@@ -58,6 +89,11 @@ class MobileViTClassifier:
         Returns:
             dict: Prediction results including class label
         """
+        image_hash = hash_image(image)
+        cached = self.result_cache.get(image_hash, self.MODEL_ID)
+        if cached is not None:
+            return cached
+
         if not isinstance(image, Image.Image):
             image = Image.open(image).convert("RGB")
             
@@ -68,10 +104,12 @@ class MobileViTClassifier:
         predicted_class_idx = logits.argmax(-1).item()
         predicted_class = self.model.config.id2label[predicted_class_idx]
         
-        return {
+        result = {
             "prediction": predicted_class,
             "model": "mobilevit_v2"
         }
+        self.result_cache.set(image_hash, self.MODEL_ID, None, result)
+        return result
     
 
 class MoondreamProcessor:
@@ -81,9 +119,36 @@ class MoondreamProcessor:
     
     """
     
-    def __init__(self, model_id="vikhyatk/moondream2", revision="2024-08-26"):
-        """Initialize the model once and load it into memory."""
+    def __init__(
+        self,
+        model_id="vikhyatk/moondream2",
+        revision="2024-08-26",
+        result_cache=None,
+        encode_batch_size=None,
+        decode_batch_size=None,
+        yes_no_scoring=True,
+        inference_workers=None,
+        inference_queue_size=None
+    ):
+        """
+        Initialize the model once and load it into memory.
+
+        With yes_no_scoring, category questions are answered by comparing the logits of the
+        "yes" and "no" tokens after a single forward pass instead of generating free text.
+        Model calls run on a dedicated InferenceExecutor with inference_workers threads and
+        at most inference_queue_size jobs admitted at once.
+        """
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.encode_batch_size = encode_batch_size or MOONDREAM_ENCODE_BATCH_SIZES[self.device]
+        self.decode_batch_size = decode_batch_size or MOONDREAM_DECODE_BATCH_SIZES[self.device]
+        self.yes_no_scoring = yes_no_scoring
+        self.executor = InferenceExecutor(
+            device=self.device,
+            max_workers=inference_workers,
+            max_queue_size=inference_queue_size
+        )
+        self.model_key = f"{model_id}@{revision}"
+        self.result_cache = result_cache if result_cache is not None else get_result_cache()
 
         # Load model and tokenizer once
         self.model = AutoModelForCausalLM.from_pretrained(
@@ -92,11 +157,18 @@ class MoondreamProcessor:
 
         self.tokenizer = AutoTokenizer.from_pretrained(model_id, revision=revision)
 
+        self.yes_token_ids = self._first_token_ids(["yes", " yes", "Yes", " Yes"])
+        self.no_token_ids = self._first_token_ids(["no", " no", "No", " No"])
+
+
+    def _first_token_ids(self, words):
+        """Returns the ids of the first token of every spelling, as the answer may start with any of them."""
+        return sorted({self.tokenizer.encode(word, add_special_tokens=False)[0] for word in words})
+
 
     async def _encode_image_async(self, image):
         """Encodes a single image asynchronously."""
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self.model.encode_image, image)
+        return await self.executor.run(self.model.encode_image, image)
 
 
     def _build_queries(self, categories):
@@ -106,69 +178,245 @@ class MoondreamProcessor:
             return MoondreamPrompts.get_no_categories_prompt()
 
 
+    def _encode_batch(self, images):
+        """
+        Runs the vision encoder once for a list of images. The encoder preprocesses the images
+        and stacks them into one tensor, so the whole list is a single forward pass.
+
+        Returns:
+            list: One (1, tokens, dim) embedding per image, as answer_question expects.
+        """
+        with torch.no_grad():
+            image_embeds = self.model.encode_image(list(images))
+        return [image_embeds[i:i + 1] for i in range(len(images))]
+
+
     async def _encode_images_in_batch(self, batch):
-        """Encodes a batch of images asynchronously."""
+        """Encodes a batch of images with one forward pass per encode_batch_size images."""
         
         # Unpack the batch tuple correctly
         filenames, images = batch
-        tasks = {filename: self._encode_image_async(image) 
-                for filename, image in zip(filenames, images)}
-        
-        encoded_images = await asyncio.gather(*tasks.values())
+
+        encoded_images = []
+        for i in range(0, len(images), self.encode_batch_size):
+            chunk = images[i:i + self.encode_batch_size]
+            encoded_images.extend(await self.executor.run(self._encode_batch, chunk))
 
         # Return a dictionary mapping filenames to encoded images
-        return {filename: enc_img for filename, enc_img in zip(tasks.keys(), encoded_images)}
+        return {filename: enc_img for filename, enc_img in zip(filenames, encoded_images)}
+
+
+    async def _encode_images_per_image(self, batch):
+        """Encodes a batch with one encode_image call per image (kept for benchmarking)."""
+        filenames, images = batch
+        encoded_images = await asyncio.gather(*[self._encode_image_async(image) for image in images])
+        return {filename: enc_img for filename, enc_img in zip(filenames, encoded_images)}
     
     
+    def _answer_prompts(self, categories):
+        """Maps each category to the single-category prompt its answer is cached under."""
+        normalized = [category.strip().lower() for category in categories]
+        return dict(zip(categories, MoondreamPrompts.get_categorized_prompt(normalized)))
+
+    def _get_cached_answers(self, image_hashes, categories):
+        """
+        Returns (cached answers, categories that still have to be asked) per image, looked up
+        with one cache query for the whole batch.
+        Without categories the open-ended answer is cached as a whole, and None means "ask".
+        """
+        if not categories:
+            cached = self.result_cache.get_many(image_hashes, self.model_key)
+            return [(cached[image_hash], []) if image_hash in cached else ({}, None) for image_hash in image_hashes]
+
+        cached = self.result_cache.get_answers_many(image_hashes, self.model_key, self._answer_prompts(categories))
+        return [
+            (cached[image_hash], [category for category in categories if category not in cached[image_hash]])
+            for image_hash in image_hashes
+        ]
+
+    def _set_cached_answers(self, categories, answers_by_hash):
+        """Stores the new answers of a batch (image hash -> answers) with one cache write."""
+        if not categories:
+            self.result_cache.set_many(self.model_key, None, answers_by_hash)
+        else:
+            self.result_cache.set_answers_many(self.model_key, self._answer_prompts(categories), answers_by_hash)
+
+    async def _hash_images(self, images):
+        # Hashing is cheap and not model work, so it stays off the inference executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: [hash_image(image) for image in images])
+
     def _parse_query_result(self, categories, results):
         parsed_results = {}
         
         if categories:
             for cat_id, category in enumerate(categories):
-                result = results[cat_id].lower()
-                parsed_results[category] = True if 'yes' in result else False        
+                result = results[cat_id]
+                if isinstance(result, bool):
+                    # Constrained yes/no scoring already returns the answer
+                    parsed_results[category] = result
+                else:
+                    parsed_results[category] = True if 'yes' in result.lower() else False
         else:
             classes = get_classes_with_nltk(results)
             parsed_results = {'custom_category': classes}
 
         return parsed_results
 
-    
-    async def ask_questions(self, enc_image, categories):
-        
-        queries = self._build_queries(categories)
-        
-        """Runs multiple queries on a single image asynchronously."""
-        loop = asyncio.get_running_loop()
-        tasks = [
-            loop.run_in_executor(None, self.model.answer_question, enc_image, q, self.tokenizer)
-            for q in queries
+
+    def _build_padded_inputs(self, pairs):
+        """
+        Embeds (image_embeds, question) pairs and left-pads them into one batch,
+        the same way the model's own batch_answer does.
+        """
+        prompt_embeds = [
+            self.model.input_embeds(f"<image>\n\nQuestion: {question}\n\nAnswer:", image_embeds, self.tokenizer)[0]
+            for image_embeds, question in pairs
         ]
-        results = await asyncio.gather(*tasks)
-        
-        # Parse the queries and results into a structured format
-        return self._parse_query_result(categories, results)
-        # return results
+        bos_embed = prompt_embeds[0][0]
+        max_len = max(p.shape[0] for p in prompt_embeds)
+
+        inputs_embeds = torch.stack([
+            torch.cat([bos_embed.repeat(max_len - p.shape[0], 1), p])
+            for p in prompt_embeds
+        ])
+        attention_mask = torch.stack([
+            torch.cat([
+                torch.zeros(max_len - p.shape[0], dtype=torch.long),
+                torch.ones(p.shape[0], dtype=torch.long)
+            ])
+            for p in prompt_embeds
+        ]).to(self.device)
+        return inputs_embeds, attention_mask
+
+
+    def _generate_batch(self, pairs, max_new_tokens=128):
+        """Decodes free-text answers for all pairs together."""
+        inputs_embeds, attention_mask = self._build_padded_inputs(pairs)
+        with torch.no_grad():
+            output_ids = self.model.text_model.generate(
+                inputs_embeds=inputs_embeds,
+                attention_mask=attention_mask,
+                eos_token_id=self.tokenizer.eos_token_id,
+                bos_token_id=self.tokenizer.bos_token_id,
+                pad_token_id=self.tokenizer.bos_token_id,
+                max_new_tokens=max_new_tokens,
+            )
+        return [answer.strip() for answer in self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)]
+
+
+    def _score_yes_no_batch(self, pairs):
+        """Answers yes/no questions with one forward pass by comparing the "yes" and "no" logits."""
+        inputs_embeds, attention_mask = self._build_padded_inputs(pairs)
+        # Left padding shifts the prompts, so positions have to follow the mask
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+        with torch.no_grad():
+            logits = self.model.text_model(
+                inputs_embeds=inputs_embeds,
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+            ).logits[:, -1, :]
+        yes_scores = logits[:, self.yes_token_ids].max(dim=-1).values
+        no_scores = logits[:, self.no_token_ids].max(dim=-1).values
+        return (yes_scores > no_scores).tolist()
+
+
+    def _answer_batch(self, pairs, yes_no):
+        if yes_no and self.yes_no_scoring:
+            return self._score_yes_no_batch(pairs)
+        return self._generate_batch(pairs, max_new_tokens=8 if yes_no else 128)
+
+
+    async def ask_questions_batch(self, encoded_images, categories_by_file):
+        """
+        Runs the queries of many images together. All (image, question) pairs are padded into
+        batches of decode_batch_size, so N images x K categories take N*K/decode_batch_size passes.
 
+        Args:
+            encoded_images: Dict mapping filenames to image embeddings
+            categories_by_file: Dict mapping filenames to the categories to ask (None for open-ended)
 
-    async def process_batch(self, batch, categories):
-        """Processes a batch of images with encoding and queries asynchronously."""        
-        # Encode images asynchronously
-        encoded_images = await self._encode_images_in_batch(batch)
-
-        # Prepare async tasks for querying
-        tasks = {
-            filename: self.ask_questions(enc_image, categories)
-            for filename, enc_image in encoded_images.items()
+        Returns:
+            Dict mapping filenames to parsed results
+        """
+        # Yes/no and open-ended questions are decoded differently, so batch them separately
+        pairs = {True: [], False: []}
+        for filename, enc_image in encoded_images.items():
+            categories = categories_by_file[filename]
+            for query_id, query in enumerate(self._build_queries(categories)):
+                pairs[bool(categories)].append((filename, query_id, enc_image, query))
+
+        answers = {filename: {} for filename in encoded_images}
+        for yes_no, kind_pairs in pairs.items():
+            for i in range(0, len(kind_pairs), self.decode_batch_size):
+                chunk = kind_pairs[i:i + self.decode_batch_size]
+                results = await self.executor.run(
+                    self._answer_batch, [(enc_image, query) for _, _, enc_image, query in chunk], yes_no
+                )
+                for (filename, query_id, _, _), result in zip(chunk, results):
+                    answers[filename][query_id] = result
+
+        # Parse the queries and results into a structured format
+        return {
+            filename: self._parse_query_result(
+                categories_by_file[filename],
+                [file_answers[query_id] for query_id in sorted(file_answers)]
+            )
+            for filename, file_answers in answers.items()
         }
 
-        # Run all queries asynchronously
-        results = await asyncio.gather(*tasks.values())
 
-        # Map results back to filenames
-        final_results = {filename: result for filename, result in zip(tasks.keys(), results)}
+    async def ask_questions(self, enc_image, categories):
+        """Runs multiple queries on a single image asynchronously."""
+        results = await self.ask_questions_batch({"image": enc_image}, {"image": categories})
+        return results["image"]
+
 
-        return final_results
+    async def process_batch(self, batch, categories):
+        """
+        Processes a batch of images with encoding and queries asynchronously.
+        Answers are cached per (image, model, single-category prompt), so only categories
+        that were never asked for an image are run, and images with nothing missing skip encoding.
+        """
+        filenames, images = batch
+        image_hashes = await self._hash_images(images)
+
+        final_results = {}
+        pending = []
+        cached_answers = self._get_cached_answers(image_hashes, categories)
+        for filename, image, image_hash, (cached, missing) in zip(filenames, images, image_hashes, cached_answers):
+            if missing is None or missing:
+                pending.append((filename, image, image_hash, cached, missing))
+            else:
+                final_results[filename] = cached
+
+        if pending:
+            pending_filenames = [filename for filename, *_ in pending]
+            pending_images = [image for _, image, *_ in pending]
+
+            # Encode images asynchronously
+            encoded_images = await self._encode_images_in_batch((pending_filenames, pending_images))
+
+            # Run only the missing queries, batched across images
+            answers = await self.ask_questions_batch(
+                encoded_images,
+                {filename: missing for filename, _, _, _, missing in pending}
+            )
+            results = [answers[filename] for filename in pending_filenames]
+
+            # Cache the new answers and merge them with the cached ones
+            self._set_cached_answers(categories, {
+                image_hash: new_answers for (_, _, image_hash, _, _), new_answers in zip(pending, results)
+            })
+            for (filename, _, image_hash, cached, missing), new_answers in zip(pending, results):
+                if categories:
+                    merged = {**cached, **new_answers}
+                    final_results[filename] = {category: merged[category] for category in categories}
+                else:
+                    final_results[filename] = new_answers
+
+        # Map results back to filenames, keeping the batch order
+        return {filename: final_results[filename] for filename in filenames}
 
 
     async def process_single_image(self, image, categories):
@@ -182,54 +430,183 @@ class MoondreamProcessor:
         Returns:
             Dict containing the results of the queries for the image
         """
-        # Encode single image
-        encoded = await self._encode_image_async(image)
-        # Run queries on the encoded image
-        results = await self.ask_questions(encoded, categories)
-        
-        return results
+        results = await self.process_batch((["image"], [image]), categories)
+        return results["image"]
     
 
 class AsyncVisionLanguageModelClassifier():
-    def __init__(self, model_name: str = LLMS['FIREWORKS_QWEN']): # add the models to the dict in this file and then you can pass them here to the model also you can add this parameter to the process single image endpoint and also provide path to the model (as inspiration)
+    def __init__(self, model_name: str = LLMS['FIREWORKS_QWEN'], image_options: dict = None): # add the models to the dict in this file and then you can pass them here to the model also you can add this parameter to the process single image endpoint and also provide path to the model (as inspiration)
+        from app.config import HOSTED_IMAGE_OPTIONS
+
         self.model_name = model_name
         self.system_prompt = ImagePrompts.DEFAULT_PROMPT
+        self.result_cache = get_result_cache()
+        # max_side, image_format, quality, grayscale for the uploaded images
+        self.image_options = {**HOSTED_IMAGE_OPTIONS, **(image_options or {})}
+        self.provider = model_name.split('/')[0]
+        self.scheduler = get_request_scheduler(self.provider, **LLM_RATE_LIMITS.get(self.provider, {}))
+        # Tokens billed per request mode, for packing_report()
+        self.token_usage = {mode: {'requests': 0, 'images': 0, 'tokens': 0} for mode in ('single', 'packed')}
+        self._estimated_prompt_savings = []
 
     @staticmethod
     def clean_llm_output(text):
-        text = text.replace('```json', '').replace('```', '')
-        text = text.replace('\n', '').replace('  ', '')
-        return json.loads(text) # you should obiously catch the erros here. Otherwise first broken json will break the whole pipeline
+        """Extracts the JSON answer from a response; raises ValueError if there is none."""
+        return extract_json(text)
+
+    def _get_cached_prediction(self, image_hash:str, categories:list[str]):
+        return self._get_cached_predictions([image_hash], categories).get(image_hash)
+
+    def _get_cached_predictions(self, image_hashes:list[str], categories:list[str]) -> dict:
+        """image hash -> validated prediction for the cached images, looked up with one query."""
+        predictions = {}
+        for image_hash, cached in self.result_cache.get_many(image_hashes, self.model_name, categories).items():
+            try:
+                predictions[image_hash] = validate_prediction(cached, categories)
+            except ValueError:
+                # Entry written before answers were validated
+                pass
+        return predictions
+
+    def _set_cached_prediction(self, image_hash:str, categories:list[str], prediction) -> None:
+        self.result_cache.set(image_hash, self.model_name, categories, prediction.model_dump())
+
+    async def _prepare_image_url(self, image_path:str, image_hash:str = None) -> str:
+        # Downscaling and re-encoding is CPU work, keep it off the event loop
+        return await asyncio.to_thread(prepare_image, image_path, image_hash=image_hash, **self.image_options)
 
-    async def _prepare_message(self, image_path:str, prompt:str) -> list[dict]:
-        base64_image = prepare_image(image_path)
-        messages = [
+    @staticmethod
+    def _build_messages(prompt:str, image_urls:list[str]) -> list[dict]:
+        content = [
             {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": prompt
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
+                "type": "text",
+                "text": prompt
             }
         ]
-        return messages
+        for index, image_url in enumerate(image_urls):
+            if len(image_urls) > 1:
+                # Packed requests: label each image with the index the answer refers to
+                content.append({"type": "text", "text": f"Image {index}:"})
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": image_url
+                }
+            })
+        return [{"role": "user", "content": content}]
+
+    async def _prepare_message(self, image_path:str, prompt:str, image_hash:str = None) -> list[dict]:
+        image_url = await self._prepare_image_url(image_path, image_hash)
+        return self._build_messages(prompt, [image_url])
+
+    def _record_usage(self, mode:str, response, n_images:int) -> None:
+        usage = getattr(response, 'usage', None)
+        self.token_usage[mode]['requests'] += 1
+        self.token_usage[mode]['images'] += n_images
+        self.token_usage[mode]['tokens'] += getattr(usage, 'total_tokens', 0) or 0
+
+    def packing_report(self) -> dict:
+        """
+        Tokens per image with and without packing, as billed by the provider.
+        Until both modes have run, the saving is estimated from the prompt tokens that
+        packing sends once per request instead of once per image.
+        """
+        report = {mode: dict(usage) for mode, usage in self.token_usage.items()}
+        for usage in report.values():
+            usage['tokens_per_image'] = round(usage['tokens'] / usage['images'], 1) if usage['images'] else None
+
+        single, packed = report['single']['tokens_per_image'], report['packed']['tokens_per_image']
+        if single and packed:
+            report['saved_tokens_per_image'] = round(single - packed, 1)
+        elif self._estimated_prompt_savings:
+            report['saved_tokens_per_image'] = round(
+                sum(self._estimated_prompt_savings) / len(self._estimated_prompt_savings), 1
+            )
+            report['saved_tokens_estimated'] = True
+        return report
+
+    @classmethod
+    def _parse_packed_response(cls, text:str, n_images:int):
+        """
+        Splits a packed answer into one prediction per image index.
+        Returns {index: prediction dict}; indexes missing from the answer are left out.
+        """
+        try:
+            parsed = cls.clean_llm_output(text)
+        except ValueError:
+            return {}
+
+        if isinstance(parsed, dict):
+            # Also accept {"0": {...}, "1": {...}}
+            parsed = [{**value, 'image_index': key} for key, value in parsed.items() if isinstance(value, dict)]
+        if not isinstance(parsed, list):
+            return {}
+
+        answers = {}
+        for position, entry in enumerate(parsed):
+            if not isinstance(entry, dict):
+                continue
+            entry = dict(entry)
+            try:
+                index = int(entry.pop('image_index', position))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < n_images:
+                answers[index] = entry
+        return answers
+
+    async def _predict_packed(self, image_paths, hash_by_path, categories, images_per_request, predictions):
+        """
+        Sends images_per_request images per request and maps the answers back to their paths.
+        Returns the paths without a usable answer, to be retried one image per request.
+        """
+        groups = [image_paths[i:i + images_per_request] for i in range(0, len(image_paths), images_per_request)]
+        unanswered = []
+
+        async def send(group):
+            prompt = ImagePrompts.get_packed_prompt(categories, len(group))
+            image_urls = await asyncio.gather(*[self._prepare_image_url(path, hash_by_path[path]) for path in group])
+            try:
+                response = await self.scheduler.run(
+                    litellm.acompletion, model=self.model_name, messages=self._build_messages(prompt, image_urls)
+                )
+            except Exception as e:
+                print(f"Packed request for {len(group)} images failed, retrying them one by one: {e}")
+                unanswered.extend(group)
+                return
+
+            self._record_usage('packed', response, len(group))
+            try:
+                prompt_tokens = litellm.token_counter(model=self.model_name, text=prompt)
+                self._estimated_prompt_savings.append(prompt_tokens * (len(group) - 1) / len(group))
+            except Exception:
+                pass
+
+            answers = self._parse_packed_response(response.choices[0].message.content, len(group))
+            for index, path in enumerate(group):
+                try:
+                    prediction = validate_prediction(answers[index], categories)
+                except (KeyError, ValueError):
+                    unanswered.append(path)
+                    continue
+                self._set_cached_prediction(hash_by_path[path], categories, prediction)
+                predictions[path] = prediction
+
+        await asyncio.gather(*[send(group) for group in groups])
+        if unanswered:
+            print(f"{len(unanswered)} of {len(image_paths)} images had no usable packed answer, falling back to one image per request")
+        return unanswered
 
     async def prepare_batch_messages(
         self,
         image_paths: list[str], 
         categories: list[str] = None, 
-        batch_size: int = 2
+        batch_size: int = 2,
+        image_hashes: list[str] = None
     ) -> list[list[dict]]:
         """
         Prepare messages for a batch of images asynchronously.
+        image_hashes (one per path) let repeated images reuse their cached payload.
         """
         if categories:
             prompt = ImagePrompts.get_categorized_prompt(categories)
@@ -240,60 +617,135 @@ class AsyncVisionLanguageModelClassifier():
         
         for i in range(0, len(image_paths), batch_size):
             batch = image_paths[i:i + batch_size]
-            tasks = [self._prepare_message(path, prompt) for path in batch]
+            hashes = image_hashes[i:i + batch_size] if image_hashes else [None] * len(batch)
+            tasks = [self._prepare_message(path, prompt, image_hash) for path, image_hash in zip(batch, hashes)]
             batch_messages = await asyncio.gather(*tasks)
             all_messages.extend(batch_messages)
         
         return all_messages
     
-    async def predict(self, image_path:str, categories:list[str]=None) -> dict:
+    async def predict(self, image_path:str, categories:list[str]=None):
+        """
+        Returns the validated answer: an instance of create_dynamic_schema(categories), or
+        NoCategoriesSchema without categories. Raises ValueError if no valid answer came
+        back within MAX_INVALID_RESPONSE_RETRIES re-requests.
+        """
+        image_hash = await asyncio.to_thread(hash_image, image_path)
+        cached = self._get_cached_prediction(image_hash, categories)
+        if cached is not None:
+            return cached
+
         if categories:
             prompt = ImagePrompts.get_categorized_prompt(categories)
         else:
             prompt = ImagePrompts.NO_CATEGORIES_PROMPT
 
-        messages = await self._prepare_message(image_path, prompt)
-
-        response = await litellm.acompletion(
-            model=self.model_name, 
-            messages=messages,
-        )
-        return response.choices[0].message.content
+        messages = await self._prepare_message(image_path, prompt, image_hash)
+
+        for _ in range(MAX_INVALID_RESPONSE_RETRIES + 1):
+            response = await self.scheduler.run(
+                litellm.acompletion,
+                model=self.model_name, 
+                messages=messages,
+            )
+            self._record_usage('single', response, 1)
+            try:
+                prediction = validate_prediction(response.choices[0].message.content, categories)
+            except ValueError as e:
+                error = e
+                continue
+            self._set_cached_prediction(image_hash, categories, prediction)
+            return prediction
+        raise ValueError(f"Invalid response for {image_path}: {error}")
     
     async def predict_batch(
         self,
         image_paths: list[str],
         categories: list[str] = None,
         prep_batch_size: int = 20,
-        request_batch_size: int = 2
+        images_per_request: int = 1
     ) -> list[dict]:
         """
         Processes images in *two* stages:
         1) Prepares all messages in batches (to avoid memory blowup).
-        2) Sends those messages to the server in smaller chunks (request_batch_size).
+        2) Sends them through the provider's RequestScheduler, which keeps a sliding window of
+           requests in flight, rate limits them and retries 429s and transient errors.
+        Images with a cached prediction for the same model and categories are not sent.
+
+        Every answer is validated against create_dynamic_schema(categories) (NoCategoriesSchema
+        without categories); only the images whose answer doesn't validate are re-requested, up
+        to MAX_INVALID_RESPONSE_RETRIES times. Predictions are schema instances, not strings.
+        Images whose request fails or never validates come back with prediction None and the error.
+
+        With images_per_request > 1, images are first packed that many per request (one prompt,
+        a JSON array answer keyed by image index); images without a usable answer fall back to
+        the per-image requests above.
         """
+        image_hashes = await asyncio.to_thread(lambda: [hash_image(path) for path in image_paths])
+        cached_by_hash = self._get_cached_predictions(image_hashes, categories)
+        cached_predictions = {
+            path: cached_by_hash[image_hash]
+            for path, image_hash in zip(image_paths, image_hashes) if image_hash in cached_by_hash
+        }
+        pending = [
+            (path, image_hash) for path, image_hash in zip(image_paths, image_hashes)
+            if path not in cached_predictions
+        ]
+        all_paths = image_paths
+        hash_by_path = dict(pending)
+        image_paths = list(hash_by_path)
+        predictions = dict(cached_predictions)
+
+        if images_per_request > 1 and image_paths:
+            image_paths = await self._predict_packed(image_paths, hash_by_path, categories, images_per_request, predictions)
+            logging.info(f"Packing report: {self.packing_report()}")
+
         # Stage 1: Prepare all messages
         batch_messages = await self.prepare_batch_messages(
             image_paths, 
             categories, 
-            batch_size=prep_batch_size
+            batch_size=prep_batch_size,
+            image_hashes=[hash_by_path[path] for path in image_paths]
         )
         # batch_messages now has one entry per image
 
-        results = []
-        # Stage 2: Send messages in smaller chunks, so you don't overload the server
-        for i in range(0, len(batch_messages), request_batch_size):
-            sub_batch = batch_messages[i:i + request_batch_size]
-            sub_tasks = [
-                litellm.acompletion(model=self.model_name, messages=messages)
-                for messages in sub_batch
-            ]
-            responses = await asyncio.gather(*sub_tasks)
-
-            # Match each response with its corresponding image path
-            for idx, response in enumerate(responses):
-                file_path = image_paths[i + idx]
-                prediction = response.choices[0].message.content
-                results.append({"file_path": file_path, "prediction": prediction})
-        
-        return results
\ No newline at end of file
+        messages_by_path = dict(zip(image_paths, batch_messages))
+        errors = {}
+        invalid = []
+
+        async def send(file_path):
+            try:
+                response = await self.scheduler.run(
+                    litellm.acompletion, model=self.model_name, messages=messages_by_path[file_path]
+                )
+            except Exception as e:
+                print(f"Request for {file_path} failed: {e}")
+                errors[file_path] = str(e)
+                return
+            self._record_usage('single', response, 1)
+            try:
+                prediction = validate_prediction(response.choices[0].message.content, categories)
+            except ValueError as e:
+                errors[file_path] = f"Invalid response: {e}"
+                invalid.append(file_path)
+                return
+            errors.pop(file_path, None)
+            self._set_cached_prediction(hash_by_path[file_path], categories, prediction)
+            predictions[file_path] = prediction
+
+        # Stage 2: All requests are queued at once; the scheduler decides how many are in flight.
+        # Later rounds only re-send the images whose answer didn't validate.
+        to_send = image_paths
+        for attempt in range(MAX_INVALID_RESPONSE_RETRIES + 1):
+            invalid = []
+            await asyncio.gather(*[send(file_path) for file_path in to_send])
+            if not invalid:
+                break
+            if attempt < MAX_INVALID_RESPONSE_RETRIES:
+                print(f"Re-requesting {len(invalid)} images with invalid answers")
+            to_send = invalid
+
+        return [
+            {"file_path": path, "prediction": predictions.get(path), **({"error": errors[path]} if path in errors else {})}
+            for path in all_paths
+        ]
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from app.core.slots import SlotLimiter
+
+# Worker threads per device. On CPU one job already uses every core through torch's
+# intra-op pool, so a second worker only makes both slower. On GPU a second worker
+# prepares the next batch on the CPU while the current one runs on the device.
+INFERENCE_WORKERS = {
+    'cuda': 2,
+    'cpu': 1,
+}
+
+# Jobs allowed in the scheduler (running + queued) before submitters have to wait
+INFERENCE_MAX_QUEUE = 8
+
+
+class InferenceExecutor:
+    """
+    Bounded scheduler for model inference jobs.
+
+    1. Runs jobs on its own thread pool instead of the event loop's default executor.
+    2. Caps running + queued jobs at max_queue_size; further submitters wait (backpressure).
+    3. Splits the CPU cores between its workers through torch.set_num_threads.
+    4. Records queue wait and execution time per job.
+    """
+    def __init__(self, device="cpu", max_workers=None, max_queue_size=None, torch_threads=None):
+        self.max_workers = max_workers or INFERENCE_WORKERS[device]
+        self.max_queue_size = max(max_queue_size or INFERENCE_MAX_QUEUE, self.max_workers)
+
+        self.set_torch_threads(torch_threads or max(1, (os.cpu_count() or 1) // self.max_workers))
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._slots = SlotLimiter(self.max_queue_size)
+        self._timings = deque(maxlen=1000)  # (queue_wait, execution) per job
+        self.completed_jobs = 0
+
+    def set_torch_threads(self, torch_threads: int) -> None:
+        """
+        Sets the intra-op threads used by the workers. The setting is process-wide; it keeps
+        concurrent jobs (or forked server workers) from oversubscribing the cores.
+        """
+        self.torch_threads = torch_threads
+        torch.set_num_threads(torch_threads)
+
+    def _timed(self, submitted_at, fn, args):
+        started_at = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._timings.append((started_at - submitted_at, finished_at - started_at))
+                self.completed_jobs += 1
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on an inference worker, waiting for a free slot first."""
+        submitted_at = time.perf_counter()
+        await self._slots.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, submitted_at, fn, args)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Queue wait and execution time percentiles (seconds) over the last 1000 jobs."""
+        with self._lock:
+            timings = list(self._timings)
+        in_flight = self._slots.in_flight
+        waiting = self._slots.waiting
+
+        def percentiles(values):
+            if not values:
+                return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+            values = sorted(values)
+            return {
+                'p50': values[len(values) // 2],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1],
+            }
+
+        return {
+            'workers': self.max_workers,
+            'torch_threads': self.torch_threads,
+            'max_queue_size': self.max_queue_size,
+            'in_flight': in_flight,
+            'waiting': waiting,
+            'completed_jobs': self.completed_jobs,
+            'queue_wait': percentiles([wait for wait, _ in timings]),
+            'execution': percentiles([execution for _, execution in timings]),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
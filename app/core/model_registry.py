@@ -0,0 +1,93 @@
+import time
+import threading
+
+import psutil
+import torch
+
+from app.config.models import MODEL_CLASSES
+
+
+def _torch_module_bytes(model_instance) -> int:
+    """Sums the parameter and buffer bytes of every torch module held by a model wrapper."""
+    total = 0
+    for value in vars(model_instance).values():
+        if isinstance(value, torch.nn.Module):
+            tensors = list(value.parameters()) + list(value.buffers())
+            total += sum(t.numel() * t.element_size() for t in tensors)
+    return total
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded models. Every route and service gets its model here,
+    so weights are loaded once per process instead of once per request.
+
+    1. Lazy, thread-safe initialization (one lock per model, so loading one model
+       does not block requests for another).
+    2. Preloading of configured models at app startup.
+    3. Memory accounting per loaded model.
+    """
+    def __init__(self, model_classes):
+        self.model_classes = model_classes
+        self._models = {}
+        self._memory = {}
+        self._locks = {model_name: threading.Lock() for model_name in model_classes}
+
+    def get(self, model_name: str):
+        """Returns the loaded model, loading it on first use."""
+        if model_name not in self.model_classes:
+            raise ValueError(f"Model '{model_name}' not found. Available models: {list(self.model_classes.keys())}")
+
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._locks[model_name]:
+            # Another thread may have loaded it while we waited for the lock
+            if model_name not in self._models:
+                self._models[model_name] = self._load(model_name)
+        return self._models[model_name]
+
+    def _load(self, model_name: str):
+        process = psutil.Process()
+        rss_before = process.memory_info().rss
+        cuda_before = torch.cuda.memory_allocated() if torch.cuda.is_available() else 0
+        start = time.perf_counter()
+
+        model = self.model_classes[model_name]()
+
+        self._memory[model_name] = {
+            'load_seconds': round(time.perf_counter() - start, 2),
+            'weights_bytes': _torch_module_bytes(model),
+            'rss_delta_bytes': process.memory_info().rss - rss_before,
+            'cuda_bytes': (torch.cuda.memory_allocated() - cuda_before) if torch.cuda.is_available() else 0,
+        }
+        print(f"Loaded model '{model_name}' in {self._memory[model_name]['load_seconds']}s "
+              f"({self._memory[model_name]['weights_bytes']/1024/1024:.0f}MB weights)")
+        return model
+
+    def preload(self, model_names: list[str]) -> None:
+        """Loads the given models up front, e.g. at app startup."""
+        for model_name in model_names:
+            self.get(model_name)
+
+    def is_loaded(self, model_name: str) -> bool:
+        return model_name in self._models
+
+    def stats(self) -> dict:
+        """Memory accounting for every loaded model, plus the process totals."""
+        return {
+            'models': {
+                model_name: {'loaded': model_name in self._models, **self._memory.get(model_name, {})}
+                for model_name in self.model_classes
+            },
+            'process_rss_bytes': psutil.Process().memory_info().rss,
+        }
+
+
+MODEL_REGISTRY = ModelRegistry(MODEL_CLASSES)
+
+
+def get_model(model_name: str):
+    """Returns a model from the process-wide registry, loading it lazily."""
+    return MODEL_REGISTRY.get(model_name)
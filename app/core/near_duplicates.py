@@ -0,0 +1,162 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+# Perceptual hash used to find near-duplicates: 'phash' (DCT, robust to resizing and
+# recompression) or 'dhash' (gradients, cheaper)
+NEAR_DUPLICATE_HASH = 'phash'
+
+# Two images whose 64-bit hashes differ in at most this many bits are treated as the same
+# picture. Resized and re-encoded copies stay within a few bits; different photos are ~32 apart.
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+
+# Run inference once per cluster of near-duplicates in the Moondream consumer
+NEAR_DUPLICATE_DEDUP = True
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _bits_to_int(bits) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+
+def _grayscale(image, size):
+    return np.asarray(image.convert('L').resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    # DCT-II basis; the scale factors don't matter for comparing against the median
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n)).astype(np.float32)
+
+
+def phash(image, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """DCT perceptual hash: the signs of the lowest hash_size x hash_size frequencies against their median."""
+    size = hash_size * highfreq_factor
+    pixels = _grayscale(image, (size, size))
+    dct = _dct_matrix(size)
+    low_frequencies = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low_frequencies > np.median(low_frequencies))
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """Difference hash: whether each pixel of a (hash_size + 1) x hash_size thumbnail is brighter than its left neighbour."""
+    pixels = _grayscale(image, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+HASH_FUNCTIONS = {
+    'phash': phash,
+    'dhash': dhash,
+}
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hamming distance. A lookup only descends into the children whose
+    edge distance is within max_distance of the query's distance to the node (triangle
+    inequality), so it touches a small part of the tree for small radii.
+    """
+    def __init__(self):
+        self.root = None  # [hash, value, {distance: child}]
+        self.size = 0
+
+    def add(self, item: int, value) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [item, value, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(item, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [item, value, {}]
+                return
+            node = child
+
+    def find(self, item: int, max_distance: int) -> list:
+        """Returns (distance, value) of every entry within max_distance, closest first."""
+        matches = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming_distance(item, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+            nodes.extend(
+                child for edge, child in node[2].items()
+                if distance - max_distance <= edge <= distance + max_distance
+            )
+        return sorted(matches, key=lambda match: match[0])
+
+    def __len__(self):
+        return self.size
+
+
+class NearDuplicateIndex:
+    """
+    Clusters the near-duplicate images of one run (the same photo at another size or URL).
+
+    1. split() hashes a batch and keeps only the first image of each cluster (its representative);
+       the other members are mapped to their representative, in this batch or an earlier one.
+    2. After inference, record() keeps the representatives' answers and fan_out() copies them
+       to every member, so callers see one result per filename as before.
+    """
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE, method: str = NEAR_DUPLICATE_HASH):
+        if method not in HASH_FUNCTIONS:
+            raise ValueError(f"Unknown hash method '{method}'. Available: {list(HASH_FUNCTIONS)}")
+        self.max_distance = max_distance
+        self.hash_function = HASH_FUNCTIONS[method]
+        self.tree = BKTree()
+        self.answers = {}  # representative filename -> answers
+        self.cluster_sizes = {}  # representative filename -> images in its cluster
+        self.duplicates = 0
+
+    def split(self, batch):
+        """
+        Args:
+            batch: (filenames, images) tuple
+
+        Returns:
+            ((filenames, images) of the representatives, {duplicate filename: representative filename})
+        """
+        filenames, images = batch
+        unique_filenames, unique_images = [], []
+        duplicate_of = {}
+        for filename, image in zip(filenames, images):
+            image_hash = self.hash_function(image)
+            matches = self.tree.find(image_hash, self.max_distance)
+            if matches:
+                representative = matches[0][1]
+                duplicate_of[filename] = representative
+                self.cluster_sizes[representative] += 1
+                self.duplicates += 1
+            else:
+                self.tree.add(image_hash, filename)
+                self.cluster_sizes[filename] = 1
+                unique_filenames.append(filename)
+                unique_images.append(image)
+        return (unique_filenames, unique_images), duplicate_of
+
+    def record(self, results: dict) -> None:
+        self.answers.update(results)
+
+    def fan_out(self, filenames, results: dict, duplicate_of: dict) -> dict:
+        """Results for every filename of the original batch, in batch order."""
+        return {
+            filename: results[filename] if filename in results else dict(self.answers[duplicate_of[filename]])
+            for filename in filenames
+        }
+
+    def stats(self) -> dict:
+        return {
+            'clusters': len(self.tree),
+            'duplicates': self.duplicates,
+            'largest_cluster': max(self.cluster_sizes.values(), default=0),
+        }
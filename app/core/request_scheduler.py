@@ -0,0 +1,195 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+from app.core.slots import SlotLimiter
+
+# Default token bucket for providers without an entry in LLM_RATE_LIMITS
+DEFAULT_REQUESTS_PER_SECOND = 4
+DEFAULT_BURST = 8
+
+# Requests in flight per provider: the adaptive limit starts at INITIAL and stays within [MIN, MAX]
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+
+# A response slower than LATENCY_TOLERANCE x the baseline latency counts as congestion
+LATENCY_TOLERANCE = 2.0
+
+# Retries of 429s, timeouts and 5xx responses, with full-jitter exponential backoff
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_MAX = 30.0  # seconds
+
+
+class TokenBucket:
+    """
+    Token bucket rate limit: requests_per_second sustained, bursts of up to burst requests.
+    Callers reserve a token (the balance may go negative) and sleep until it's theirs,
+    so waiting needs no event loop specific primitive and works from any loop.
+    """
+    def __init__(self, requests_per_second, burst):
+        self.rate = requests_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+def _is_rate_limited(error):
+    return getattr(error, 'status_code', None) == 429
+
+
+def _is_retryable(error):
+    status_code = getattr(error, 'status_code', None)
+    if isinstance(status_code, int):
+        return status_code in (408, 409, 429) or status_code >= 500
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+
+def _retry_after(error):
+    """Seconds from the Retry-After header of a 429 response, if the provider sent one."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Sliding-window scheduler for requests to one hosted provider.
+
+    1. Keeps up to `limit` requests in flight; a finished request immediately frees its slot
+       for the next one instead of waiting for the rest of a chunk.
+    2. Rate limits request starts with a token bucket.
+    3. Adjusts the limit AIMD-style: +1 per window of fast responses, halved on a 429,
+       reduced by a quarter when latency exceeds LATENCY_TOLERANCE x the baseline.
+    4. Retries 429s, timeouts and 5xx responses with jittered exponential backoff.
+    """
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST,
+                 initial_concurrency=INITIAL_CONCURRENCY, min_concurrency=MIN_CONCURRENCY,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._slots = SlotLimiter(int(self.limit))
+        self._baseline_latency = None
+        self._last_decrease = 0.0
+        self._latencies = deque(maxlen=1000)
+        self.counters = {'completed': 0, 'rate_limited': 0, 'retries': 0, 'failed': 0}
+
+    # AIMD
+
+    def _on_success(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self.counters['completed'] += 1
+            if self._baseline_latency is None:
+                self._baseline_latency = latency
+
+            if latency > LATENCY_TOLERANCE * self._baseline_latency:
+                self._decrease(0.75)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self._slots.limit = int(self.limit)
+            # Slow moving average, so a queueing provider stands out against it
+            self._baseline_latency += 0.05 * (latency - self._baseline_latency)
+
+    def _on_rate_limited(self):
+        with self._lock:
+            self.counters['rate_limited'] += 1
+            self._decrease(0.5)
+
+    def _decrease(self, factor):
+        # At most one decrease per baseline latency, so one burst of slow responses
+        # doesn't collapse the window to the minimum
+        now = time.monotonic()
+        if now - self._last_decrease < (self._baseline_latency or 0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * factor)
+        self._slots.limit = int(self.limit)
+
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs the coroutine function fn(*args, **kwargs) under the rate limit, with retries."""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            await self._slots.acquire()
+            started_at = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if _is_rate_limited(e):
+                    self._on_rate_limited()
+                if not _is_retryable(e) or attempt == self.max_retries:
+                    with self._lock:
+                        self.counters['failed'] += 1
+                    raise
+                error = e
+            else:
+                self._on_success(time.perf_counter() - started_at)
+                return result
+            finally:
+                self._slots.release()
+
+            with self._lock:
+                self.counters['retries'] += 1
+            await asyncio.sleep(self._backoff(attempt, error))
+
+    def stats(self) -> dict:
+        """Current window, counters and latency percentiles (seconds) over the last 1000 requests."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'limit': round(self.limit, 2),
+                'in_flight': self._slots.in_flight,
+                'waiting': self._slots.waiting,
+                'requests_per_second': self.bucket.rate,
+                **self.counters,
+            }
+        if latencies:
+            stats['latency'] = {
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+                'max': latencies[-1],
+            }
+        return stats
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_request_scheduler(provider: str, **limits) -> RequestScheduler:
+    """Returns the process-wide scheduler of a provider, so all its requests share one window."""
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            _schedulers[provider] = RequestScheduler(**limits)
+        return _schedulers[provider]
@@ -1,5 +1,8 @@
 from pydantic import Field, create_model, BaseModel
-from typing import Optional
+from typing import Optional, Union
+from functools import lru_cache
+import json
+import re
 from nltk import word_tokenize, pos_tag, RegexpParser
 
 # Image Prompts
@@ -44,13 +47,66 @@ class ImagePrompts:
         - Do not include any explanations or text outside of the JSON object.
         - Ensure the JSON is properly formatted with no syntax errors.
         """
-       
+
+    @classmethod
+    def get_packed_prompt(cls, categories: list[str], n_images: int) -> str:
+        """Prompt for several images in one request; the answer is one JSON object per image index."""
+        if categories:
+            categories_str = ", ".join(categories)
+            task = f"determine for each image if it contains any of the following categories: {categories_str}"
+            answer_format = """"categories": {
+                    "category1": true/false,
+                    "category2": true/false,
+                    ...
+                },
+                "custom_category": "your-category-here" (if applicable)"""
+            instructions = """- For each image and each category, respond with `true` if you can spot the object in that image, and `false` otherwise.
+        - If none of the categories match an image, assign your own single-word category to describe it."""
+        else:
+            task = "determine the most appropriate category for each image"
+            answer_format = '"prediction": "your-category-here"'
+            instructions = "- Provide a single category that best describes the content of each image."
+
+        return f"""
+        You are an advanced AI system specializing in image recognition. You are given {n_images} images, labeled Image 0 to Image {n_images - 1}. Your task is to {task}.
+
+        **Instructions:**
+        - Judge every image on its own; do not mix up their contents.
+        {instructions}
+        - Return a JSON array with exactly {n_images} objects, one per image, in image order:
+        ```json
+        [
+            {{
+                "image_index": 0,
+                {answer_format}
+            }},
+            ...
+        ]
+        ```
+        - Do not include any explanations or text outside of the JSON array.
+        - Ensure the JSON is properly formatted with no syntax errors.
+        """
 
 
 class NoCategoriesSchema(BaseModel):
     prediction: str
 
 
+# A bare answer to the no-categories prompt is accepted only if it looks like a category:
+# a few words of letters, digits, spaces and -&'/, not a sentence or an explanation
+CATEGORY_LABEL_PATTERN = re.compile(r"[^\W_][\w&'/ -]*")
+CATEGORY_LABEL_MAX_LENGTH = 40
+CATEGORY_LABEL_MAX_WORDS = 3
+
+
+def is_category_label(text: str) -> bool:
+    return (
+        len(text) <= CATEGORY_LABEL_MAX_LENGTH
+        and len(text.split()) <= CATEGORY_LABEL_MAX_WORDS
+        and CATEGORY_LABEL_PATTERN.fullmatch(text) is not None
+    )
+
+
 def create_dynamic_schema(categories: list[str]):
     """
     Dynamically create a Pydantic model schema based on the user-provided categories.
@@ -59,10 +115,93 @@ def create_dynamic_schema(categories: list[str]):
         category: (bool, Field(..., description=f"Whether the image contains {category}"))
         for category in categories
     }
-    fields['custom_category'] = (Optional[str], str)
+    fields['custom_category'] = (Optional[str], None)
     return create_model("DynamicImageSchema", **fields)
 
 
+@lru_cache(maxsize=256)
+def _cached_dynamic_schema(categories: tuple):
+    # Building a pydantic model is slow compared to validating one answer
+    return create_dynamic_schema(list(categories))
+
+
+def extract_json(text: str, objects_only: bool = False) -> Union[dict, list]:
+    """
+    Extracts the first JSON object or array from a model response, ignoring code fences,
+    explanations before or after it and a trailing unterminated fragment.
+    With objects_only, complete arrays are skipped and the first object after them is returned.
+    Raises ValueError if the response contains no JSON (no object, with objects_only).
+    """
+    if not isinstance(text, str):
+        raise ValueError(f"Expected a string response, got {type(text).__name__}")
+    text = text.replace('```json', '').replace('```', '')
+
+    decoder = json.JSONDecoder()
+    start = 0
+    while start < len(text):
+        if text[start] in '{[':
+            try:
+                parsed, end = decoder.raw_decode(text, start)
+            except json.JSONDecodeError:
+                start += 1
+                continue
+            if not objects_only or isinstance(parsed, dict):
+                return parsed
+            start = end
+            continue
+        start += 1
+    kind = 'JSON object' if objects_only else 'JSON'
+    raise ValueError(f"No {kind} found in response: {text[:100]!r}")
+
+
+def validate_prediction(response: Union[str, dict], categories: Optional[list[str]] = None) -> BaseModel:
+    """
+    Validates one image's answer against create_dynamic_schema(categories), or against
+    NoCategoriesSchema when there are no categories.
+
+    Args:
+        response: Raw response text, or an already parsed answer
+            ({"categories": {...}, "custom_category": ...} or flat category fields)
+
+    Returns:
+        An instance of the schema; raises ValueError (pydantic's ValidationError included)
+        if the answer doesn't fit it.
+    """
+    if not categories:
+        return _validate_no_categories(response)
+
+    data = response if isinstance(response, dict) else extract_json(response, objects_only=True)
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+
+    answers = data.get('categories') if isinstance(data.get('categories'), dict) else data
+    # Models don't always keep the category's case or spacing
+    answers = {str(key).strip().lower(): value for key, value in answers.items()}
+    fields = {category: answers.get(category.strip().lower()) for category in categories}
+    # Some models put custom_category inside "categories"
+    custom_category = data.get('custom_category')
+    fields['custom_category'] = custom_category if custom_category is not None else answers.get('custom_category')
+    return _cached_dynamic_schema(tuple(categories)).model_validate(fields)
+
+
+def _validate_no_categories(response: Union[str, dict]) -> NoCategoriesSchema:
+    # The no-categories prompt asks for a bare category; anything with JSON in it must be a
+    # {"prediction": ...} object, so lists, prose and half-written JSON are retried
+    if isinstance(response, str) and not any(char in response for char in '{['):
+        label = response.strip().strip('."\'').strip()
+        if not is_category_label(label):
+            raise ValueError(f"Not a single category: {response[:100]!r}")
+        return NoCategoriesSchema(prediction=label)
+
+    data = response if isinstance(response, dict) else extract_json(response, objects_only=True)
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    prediction = NoCategoriesSchema.model_validate(data)
+    if not prediction.prediction.strip():
+        raise ValueError("Empty prediction")
+    return prediction
+
+
 class MoondreamPrompts:
     @classmethod
     def get_categorized_prompt(cls, categories: list[str]) -> str:
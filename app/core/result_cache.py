@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from PIL import Image
+
+
+def hash_image(image) -> str:
+    """
+    Returns a SHA-256 content hash for an image.
+
+    Args:
+        image: A PIL.Image (hashed on its decoded pixels), a file-like object or a path
+            (hashed on the file bytes).
+    """
+    sha256 = hashlib.sha256()
+    if isinstance(image, Image.Image):
+        sha256.update(f"{image.mode}:{image.size}".encode())
+        sha256.update(image.tobytes())
+    elif hasattr(image, 'read'):
+        sha256.update(image.read())
+        image.seek(0)
+    else:
+        with open(image, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def normalize_categories(categories: Optional[list[str]]) -> list[str]:
+    """Normalizes a category list so equivalent requests share cache entries."""
+    return sorted({category.strip().lower() for category in categories or []})
+
+
+class MemoryResultBackend:
+    """In-memory LRU backend. Entries live as long as the process."""
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Values of the keys that are cached."""
+        values = {}
+        with self._lock:
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                    values[key] = value
+        return values
+
+    def set(self, key: str, value: str) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, str]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteResultBackend:
+    """
+    On-disk backend, shared by all worker processes and kept across restarts.
+    Every thread keeps one connection open, and a batch is read or written with one query.
+    """
+    # SQLite builds before 3.32 allow at most 999 parameters per statement
+    MAX_KEYS_PER_QUERY = 500
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_created_at ON results (created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # A forked worker must not use the connection its parent opened, so it's keyed by pid
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Values of the keys that are cached."""
+        keys = list(dict.fromkeys(keys))
+        conn = self._connect()
+        values = {}
+        for i in range(0, len(keys), self.MAX_KEYS_PER_QUERY):
+            chunk = keys[i:i + self.MAX_KEYS_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            values.update(conn.execute(f"SELECT key, value FROM results WHERE key IN ({placeholders})", chunk))
+        return values
+
+    def set(self, key: str, value: str) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, str]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()]
+            )
+            # Pruning is a full scan, so only do it every so often
+            previous_writes, self._writes = self._writes, self._writes + len(items)
+            if previous_writes // 1000 != self._writes // 1000:
+                conn.execute("""
+                    DELETE FROM results WHERE key IN (
+                        SELECT key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class ResultCache:
+    """
+    Caches classification results keyed by (image hash, model id/revision, normalized categories),
+    so images that did not change between crawls are not sent through the model again.
+    """
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryResultBackend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_hash: str, model_key: str, categories: Optional[list[str]]) -> str:
+        return f"{model_key}|{json.dumps(normalize_categories(categories))}|{image_hash}"
+
+    def _lookup(self, keys: list[str]) -> Dict[str, Any]:
+        # One backend query for all keys; hits and misses are counted per key
+        values = self.backend.get_many(keys)
+        with self._lock:
+            self.hits += len(values)
+            self.misses += len(set(keys)) - len(values)
+        return {key: json.loads(value) for key, value in values.items()}
+
+    def get(self, image_hash: str, model_key: str, categories: Optional[list[str]] = None) -> Optional[Any]:
+        key = self.make_key(image_hash, model_key, categories)
+        return self._lookup([key]).get(key)
+
+    def get_many(self, image_hashes: list[str], model_key: str,
+                 categories: Optional[list[str]] = None) -> Dict[str, Any]:
+        """image hash -> result for every image of a batch found in the cache."""
+        keys = {image_hash: self.make_key(image_hash, model_key, categories) for image_hash in image_hashes}
+        found = self._lookup(list(keys.values()))
+        return {image_hash: found[key] for image_hash, key in keys.items() if key in found}
+
+    def set(self, image_hash: str, model_key: str, categories: Optional[list[str]], result: Any) -> None:
+        self.backend.set(self.make_key(image_hash, model_key, categories), json.dumps(result))
+
+    def set_many(self, model_key: str, categories: Optional[list[str]], results: Dict[str, Any]) -> None:
+        """Stores image hash -> result for a batch in one backend write."""
+        self.backend.set_many({
+            self.make_key(image_hash, model_key, categories): json.dumps(result)
+            for image_hash, result in results.items()
+        })
+
+    def get_answers(self, image_hash: str, model_key: str, prompts: dict[str, str]) -> dict:
+        """
+        Looks up single-question answers, so requests with overlapping category lists share them.
+
+        Args:
+            prompts: Maps a caller label (e.g. the category) to its single-category prompt.
+
+        Returns:
+            dict: label -> answer for every prompt found in the cache.
+        """
+        return self.get_answers_many([image_hash], model_key, prompts)[image_hash]
+
+    def get_answers_many(self, image_hashes: list[str], model_key: str, prompts: dict[str, str]) -> Dict[str, dict]:
+        """get_answers for every image of a batch, with one backend query: image hash -> label -> answer."""
+        keys = {
+            (image_hash, label): self.make_key(image_hash, model_key, [prompt])
+            for image_hash in image_hashes
+            for label, prompt in prompts.items()
+        }
+        found = self._lookup(list(keys.values()))
+        answers = {image_hash: {} for image_hash in image_hashes}
+        for (image_hash, label), key in keys.items():
+            if key in found:
+                answers[image_hash][label] = found[key]
+        return answers
+
+    def set_answers(self, image_hash: str, model_key: str, prompts: dict[str, str], answers: dict) -> None:
+        """Stores one entry per (image, model, single-category prompt)."""
+        self.set_answers_many(model_key, prompts, {image_hash: answers})
+
+    def set_answers_many(self, model_key: str, prompts: dict[str, str], answers_by_hash: Dict[str, dict]) -> None:
+        """set_answers for every image of a batch, in one backend write."""
+        self.backend.set_many({
+            self.make_key(image_hash, model_key, [prompts[label]]): json.dumps(answer)
+            for image_hash, answers in answers_by_hash.items()
+            for label, answer in answers.items()
+        })
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Returns the process-wide result cache, built with the configured backend."""
+    # app.config imports the model classes, so read it lazily to avoid a circular import
+    from app.config import RESULT_CACHE_BACKEND, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH
+
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                if RESULT_CACHE_BACKEND == 'memory':
+                    backend = MemoryResultBackend(RESULT_CACHE_MAX_ENTRIES)
+                elif RESULT_CACHE_BACKEND == 'sqlite':
+                    backend = SQLiteResultBackend(RESULT_CACHE_PATH, RESULT_CACHE_MAX_ENTRIES)
+                else:
+                    raise ValueError(f"Invalid result cache backend: {RESULT_CACHE_BACKEND}")
+                _result_cache = ResultCache(backend)
+    return _result_cache
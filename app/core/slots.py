@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class SlotLimiter:
+    """
+    Caps how many jobs run at once, for coroutines on any event loop.
+
+    A released slot is handed straight to the oldest waiter through its own loop
+    (call_soon_threadsafe), so release() may be called from any thread and no
+    loop-bound primitive like asyncio.Semaphore is shared between loops.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Returns holding a slot, or raises (CancelledError) without one."""
+        with self._lock:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Cancelled after the slot was handed over but before the task resumed: give it back
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            # A raised limit may admit several waiters at once
+            self.in_flight -= 1
+            while self._waiters and self.in_flight < self.limit:
+                loop, waiter = self._waiters.popleft()
+                self.in_flight += 1
+                loop.call_soon_threadsafe(self._hand_over, waiter)
+
+    def _hand_over(self, waiter):
+        if waiter.done():
+            # The waiter was cancelled, pass the slot on
+            self.release()
+        else:
+            waiter.set_result(None)
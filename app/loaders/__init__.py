@@ -1,3 +1,4 @@
-from .loaders import ImageLoader, ModelLoader
+from .loaders import ImageLoader, ModelLoader, load_and_preprocess_image
+from .decoding import decode_image, decoder_info
 
-__all__ = ['ImageLoader', 'ModelLoader']
\ No newline at end of file
+__all__ = ['ImageLoader', 'ModelLoader', 'load_and_preprocess_image', 'decode_image', 'decoder_info']
\ No newline at end of file
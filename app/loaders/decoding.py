@@ -0,0 +1,81 @@
+from PIL import Image, features
+
+from app.config import IMAGE_DECODE_BACKEND, IMAGE_RESAMPLE
+
+try:
+    import cv2
+except ImportError:  # OpenCV is optional, the PIL backend needs nothing extra
+    cv2 = None
+
+RESAMPLE_FILTERS = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS,
+}
+
+# Downscale factors libjpeg can apply while decoding (IMREAD_REDUCED_COLOR_* in OpenCV)
+_CV2_REDUCED_FLAGS = {
+    8: 'IMREAD_REDUCED_COLOR_8',
+    4: 'IMREAD_REDUCED_COLOR_4',
+    2: 'IMREAD_REDUCED_COLOR_2',
+}
+
+
+def decoder_info() -> dict:
+    """Which decoding libraries are available, for benchmarks and logs."""
+    return {
+        'pillow': Image.__version__,
+        # pillow-simd versions end in .postN
+        'pillow_simd': '.post' in Image.__version__,
+        'libjpeg_turbo': bool(features.check_feature('libjpeg_turbo')),
+        'opencv': cv2.__version__ if cv2 is not None else None,
+    }
+
+
+def _decode_pil(image_path, target_size, resample):
+    with Image.open(image_path) as img:
+        # JPEG only: let libjpeg downscale in the DCT domain by 1/2, 1/4 or 1/8, keeping
+        # the image at least target_size, instead of decoding every pixel at full resolution
+        img.draft("RGB", target_size)
+        img = img.convert("RGB")
+        # reducing_gap first shrinks by an integer factor (cheap box filter), then resamples
+        return img.resize(target_size, resample, reducing_gap=3.0)
+
+
+def _decode_cv2(image_path, target_size, resample):
+    # Read the header only to pick the largest decode-time reduction that keeps target_size
+    with Image.open(image_path) as img:
+        width, height = img.size
+        is_jpeg = img.format == "JPEG"
+
+    flag = cv2.IMREAD_COLOR
+    if is_jpeg:
+        for factor, flag_name in _CV2_REDUCED_FLAGS.items():
+            if width // factor >= target_size[0] and height // factor >= target_size[1]:
+                flag = getattr(cv2, flag_name)
+                break
+
+    array = cv2.imread(image_path, flag)
+    if array is None:
+        raise ValueError(f"OpenCV cannot decode {image_path}")
+    interpolation = cv2.INTER_AREA if resample != Image.NEAREST else cv2.INTER_NEAREST
+    array = cv2.resize(array, target_size, interpolation=interpolation)
+    return Image.fromarray(cv2.cvtColor(array, cv2.COLOR_BGR2RGB))
+
+
+def decode_image(image_path, target_size=(512, 512), backend=IMAGE_DECODE_BACKEND, resample=IMAGE_RESAMPLE):
+    """
+    Decodes an image file into an RGB PIL.Image of target_size.
+
+    Args:
+        backend: 'pil' (draft-mode JPEG decoding) or 'opencv' (falls back to 'pil' if OpenCV is not installed)
+        resample: 'nearest', 'bilinear', 'bicubic' or 'lanczos'. The models resize again in their
+            own preprocessors, so a cheap filter here loses nothing.
+    """
+    resample = RESAMPLE_FILTERS[resample]
+    if backend == 'opencv' and cv2 is not None:
+        return _decode_cv2(image_path, target_size, resample)
+    if backend not in ('pil', 'opencv'):
+        raise ValueError(f"Unknown decode backend '{backend}'")
+    return _decode_pil(image_path, target_size, resample)
@@ -1,53 +1,199 @@
-from PIL import Image
 import os
+import itertools
+from contextlib import contextmanager
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from app.core.image_models import AsyncVisionLanguageModelClassifier, MoondreamProcessor
+from app.core.model_registry import get_model
+from app.utils.image_cache import ImageCache
+from app.loaders.decoding import decode_image
+from concurrent.futures.process import BrokenProcessPool
+from app.loaders.shared_decoding import (
+    decode_to_shared_memory,
+    load_from_shared_memory,
+    discard_decode_future,
+    get_decode_process_pool,
+    DECODE_PROCESS_POOL,
+)
+from app.config import IMAGE_DECODE_BACKEND, IMAGE_RESAMPLE, IMAGE_DECODE_PROCESSES, SUPPORTED_IMAGE_FORMATS
+
+IMAGE_EXTENSIONS = tuple(f'.{extension}' for extension in SUPPORTED_IMAGE_FORMATS)
+
+
+def load_and_preprocess_image(image_path, target_size=(512, 512), **decode_options):
+    """
+    Loads an image from disk and preprocesses it (resize). Returns (filename, PIL.Image) or None.
+    decode_options (backend, resample) are passed on to decode_image.
+    """
+    try:
+        return os.path.basename(image_path), decode_image(image_path, target_size, **decode_options)
+    except Exception as e:
+        print(f"Error loading {image_path}: {e}")
+        return None
 
 
 class ImageLoader:
     """
-    1. Loads and preprocesses images from a folder to memory.
+    1. Streams images from a manifest of paths (or a folder): batches are decoded and preprocessed on demand.
     2. Prepares batches of images for model input.
+
+    Pipelines pass the local paths their own download returned as image_paths, so a run only
+    sees its own images; folder_path scanning is meant for dedicated folders (e.g. test sets),
+    never for the shared TEMP_IMAGE_DIR.
+
+    At most prefetch_batches batches are decoded ahead of the one being consumed, and a batch
+    is released once the consumer moves on, so memory stays bounded whatever the folder size.
     """
-    def __init__(self, folder_path, target_size=(512, 512), max_workers=4):
+    def __init__(self, folder_path=None, target_size=(512, 512), max_workers=4, prefetch_batches=2, image_paths=None,
+                 backend=IMAGE_DECODE_BACKEND, resample=IMAGE_RESAMPLE, decode_processes=IMAGE_DECODE_PROCESSES):
+        if folder_path is None and image_paths is None:
+            raise ValueError("Either folder_path or image_paths is required")
         self.folder_path = folder_path
+        self.image_paths = list(image_paths) if image_paths is not None else None
+        self.backend = backend
+        self.resample = resample
+        self.decode_processes = decode_processes
         self.target_size = target_size
         self.max_workers = max_workers
-        self.image_data = []  # Store loaded images
-
-        # Auto-load images on initialization
-        self.load_images()
+        self.prefetch_batches = prefetch_batches
+        self.image_data = []  # Only filled by an explicit load_images() call
 
     def _load_and_preprocess_image(self, image_path):
         """Loads an image from disk and preprocesses it (resize)."""
-        try:
-            with Image.open(image_path) as img:
-                img = img.convert("RGB")
-                img = img.resize(self.target_size, Image.LANCZOS)
-                return os.path.basename(image_path), img
-        except Exception as e:
-            print(f"Error loading {image_path}: {e}")
-            return None
+        return load_and_preprocess_image(image_path, self.target_size, backend=self.backend, resample=self.resample)
 
-    def load_images(self):
-        """Loads and preprocesses all images in parallel, storing them in self.image_data."""
-        image_files = [
+    @contextmanager
+    def _decode_executor(self):
+        """Threads by default; the shared process pool when decode_processes is set."""
+        if self.decode_processes:
+            yield get_decode_process_pool(self.decode_processes)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                yield executor
+
+    def _submit_decode(self, executor, image_path):
+        if self.decode_processes:
+            decode_options = {'backend': self.backend, 'resample': self.resample}
+            try:
+                return executor.submit(decode_to_shared_memory, image_path, self.target_size, decode_options)
+            except BrokenProcessPool:
+                # A worker died earlier: continue on a freshly forked pool
+                DECODE_PROCESS_POOL.reset(executor)
+                executor = get_decode_process_pool(self.decode_processes)
+                return executor.submit(decode_to_shared_memory, image_path, self.target_size, decode_options)
+        return executor.submit(self._load_and_preprocess_image, image_path)
+
+    def _decode_result(self, future):
+        """(filename, PIL.Image) or None; process results are read back from shared memory."""
+        if self.decode_processes:
+            try:
+                return load_from_shared_memory(future.result())
+            except BrokenProcessPool:
+                # The next submit replaces the pool
+                print("Error loading image: decode worker died")
+                return None
+        return future.result()
+
+    @classmethod
+    def from_downloads(cls, downloaded_images, **kwargs):
+        """Creates a loader for the images one download_images() call returned."""
+        return cls(image_paths=[img["local_path"] for img in downloaded_images if img.get("local_path")], **kwargs)
+
+    def _list_image_files(self):
+        if self.image_paths is not None:
+            return [
+                path for path in self.image_paths
+                if path.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+        return [
             os.path.join(self.folder_path, f) for f in os.listdir(self.folder_path)
-            if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+            if f.lower().endswith(IMAGE_EXTENSIONS)
         ]
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            results = executor.map(self._load_and_preprocess_image, image_files)
+    def load_images(self):
+        """
+        Eagerly loads and preprocesses all images in parallel, storing them in self.image_data.
+        Memory grows with the folder size; prefer iterating batch_images() directly.
+        Files linked from the image cache carry their content hash in the name, so every
+        cached image is decoded once no matter how many domains reference it.
+        """
+        image_files = self._list_image_files()
+
+        # Pick one file per distinct content to decode
+        unique_files = {}
+        for image_file in image_files:
+            key = ImageCache.content_key(image_file) or image_file
+            unique_files.setdefault(key, image_file)
+
+        with self._decode_executor() as executor:
+            futures = {key: self._submit_decode(executor, image_file) for key, image_file in unique_files.items()}
+            results = {key: self._decode_result(future) for key, future in futures.items()}
+        decoded = {key: result[1] for key, result in results.items() if result}
 
-        self.image_data = [result for result in results if result]  # Store as [(filename, PIL.Image)]
-        print(f"Loaded {len(self.image_data)} images from {self.folder_path}")
+        self.image_data = [  # Store as [(filename, PIL.Image)]
+            (os.path.basename(image_file), decoded[key])
+            for image_file in image_files
+            if (key := ImageCache.content_key(image_file) or image_file) in decoded
+        ]
+        print(f"Loaded {len(self.image_data)} images from {self.folder_path or 'manifest'}")
+
+    def _submit_batch(self, executor, image_files):
+        """
+        Schedules the decoding of one batch; files sharing cached content are decoded once.
+        Returns the batch's (filename, key) pairs and one future per key.
+        """
+        futures = {}
+        batch = []
+        for image_file in image_files:
+            key = ImageCache.content_key(image_file) or image_file
+            if key not in futures:
+                futures[key] = self._submit_decode(executor, image_file)
+            batch.append((os.path.basename(image_file), key))
+        return batch, futures
 
     def batch_images(self, batch_size=8):
-        """Generates batches of images while keeping filenames linked."""
-        for i in range(0, len(self.image_data), batch_size):
-            batch = self.image_data[i : i + batch_size]
-            filenames, images = zip(*batch)  # Separate filenames and images
-            yield filenames, images
+        """
+        Generates batches of images while keeping filenames linked.
+        Decoding runs on the thread (or process) pool up to prefetch_batches batches ahead.
+        """
+        if self.image_data:
+            # Images were loaded eagerly with load_images()
+            for i in range(0, len(self.image_data), batch_size):
+                batch = self.image_data[i : i + batch_size]
+                filenames, images = zip(*batch)  # Separate filenames and images
+                yield filenames, images
+            return
+
+        image_files = self._list_image_files()
+        file_batches = (image_files[i : i + batch_size] for i in range(0, len(image_files), batch_size))
+
+        with self._decode_executor() as executor:
+            pending = deque(
+                self._submit_batch(executor, files)
+                for files in itertools.islice(file_batches, self.prefetch_batches + 1)
+            )
+            try:
+                while pending:
+                    batch, futures = pending.popleft()
+
+                    # Keep the prefetch window full
+                    next_files = next(file_batches, None)
+                    if next_files:
+                        pending.append(self._submit_batch(executor, next_files))
+
+                    results = {key: self._decode_result(future) for key, future in futures.items()}
+                    loaded = [(filename, results[key][1]) for filename, key in batch if results[key]]
+                    del batch, futures, results
+                    if loaded:
+                        filenames, images = zip(*loaded)  # Separate filenames and images
+                        yield filenames, images
+            finally:
+                # The consumer stopped early: drop prefetched results (and free their shared memory)
+                for _, futures in pending:
+                    for future in futures.values():
+                        if self.decode_processes:
+                            discard_decode_future(future)
+                        else:
+                            future.cancel()
 
 
 class ModelLoader: # this should've been a switch for the model type where you can pass the model type as a parameter to an endpoint. you can have it as inspiration
@@ -63,8 +209,8 @@ class ModelLoader: # this should've been a switch for the model type where you c
         
     def _initialize_model(self):
         if self.model_type == "local":
-            return MoondreamProcessor()
+            return get_model('moondream')
         elif self.model_type == "hosted":
-            return AsyncVisionLanguageModelClassifier()
+            return get_model('vllm')
         else:
             raise ValueError(f"Invalid model type: {self.model_type}")
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import asyncio
+from multiprocessing import shared_memory, resource_tracker
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+from app.loaders.decoding import decode_image
+from app.utils.process_pool import ForkedProcessPool
+
+
+def decode_to_shared_memory(image_path, target_size=(512, 512), decode_options=None):
+    """
+    Runs in a worker process: decodes an image and writes its pixels into a new shared memory
+    block. Only the block's name and shape go back through the pipe, not the pixels.
+
+    Returns:
+        tuple: (filename, shared memory name, array shape), or None if the image can't be decoded
+    """
+    try:
+        pixels = np.asarray(decode_image(image_path, target_size, **(decode_options or {})), dtype=np.uint8)
+    except Exception as e:
+        print(f"Error loading {image_path}: {e}")
+        return None
+
+    shm = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+    np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+    # The parent owns the block from here on and unlinks it. Before Python 3.13 both the
+    # creation here and the parent's attach register it with the resource tracker, which
+    # would then report it as leaked (and unlink it again) at shutdown.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return os.path.basename(image_path), shm.name, pixels.shape
+
+
+def release_shared_memory(handle):
+    """Frees the block of a handle that is not going to be read."""
+    if handle is None:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=handle[1])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _release_result(future):
+    if not future.cancelled() and future.exception() is None:
+        release_shared_memory(future.result())
+
+
+def discard_decode_future(future):
+    """
+    Gives up on a submitted decode: cancels it if it hasn't started, otherwise frees its
+    shared memory as soon as the worker is done.
+    """
+    if not future.cancel():
+        future.add_done_callback(_release_result)
+
+
+@contextmanager
+def shared_array(handle):
+    """
+    Maps a block written by decode_to_shared_memory as a uint8 array without copying it.
+    The array is only valid inside the with block, and the caller must drop its references
+    (and views) before the block exits and frees the memory.
+
+    Yields:
+        np.ndarray: Pixels of shape (height, width, 3)
+    """
+    _, name, shape = handle
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        yield array
+    finally:
+        del array
+        shm.close()
+        shm.unlink()
+
+
+def load_from_shared_memory(handle):
+    """Reads a decoded block back as (filename, PIL.Image), as load_and_preprocess_image returns."""
+    if handle is None:
+        return None
+    with shared_array(handle) as array:
+        # PIL keeps RGB pixels in its own storage: this is the single copy out of the block
+        image = Image.fromarray(array, mode="RGB")
+        del array
+    return handle[0], image
+
+
+# Workers only run PIL and NumPy code, so the model weights they inherit stay shared copy-on-write.
+# Servers fork them at startup (app.utils.process_pool.start_process_pools).
+DECODE_PROCESS_POOL = ForkedProcessPool("Decode")
+
+
+def get_decode_process_pool(max_workers):
+    """Returns the process-wide decode pool, forking it if it wasn't started yet."""
+    return DECODE_PROCESS_POOL.get(max_workers)
+
+
+async def decode_in_process_pool(image_path, target_size, max_workers, decode_options=None):
+    """
+    Decodes an image on the process pool from a coroutine; returns (filename, PIL.Image) or None.
+    If the coroutine is cancelled, the block the worker is writing is freed when it finishes.
+    """
+    pool = get_decode_process_pool(max_workers)
+    try:
+        future = pool.submit(decode_to_shared_memory, image_path, target_size, decode_options)
+        try:
+            handle = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            discard_decode_future(future)
+            raise
+    except BrokenProcessPool:
+        DECODE_PROCESS_POOL.reset(pool)
+        print(f"Error loading {image_path}: decode worker died")
+        return None
+    return load_from_shared_memory(handle)
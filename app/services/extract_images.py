@@ -1,45 +1,130 @@
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
 from urllib.parse import urljoin, urlparse
 import os
+import asyncio
+import sqlite3
 import requests
+import aiohttp
 import logging
-from app.config import TEMP_IMAGE_DIR
+from app.config import (
+    TEMP_IMAGE_DIR,
+    TARGET_IMAGE_SIZE,
+    SUPPORTED_IMAGE_FORMATS,
+    MAX_IMAGE_SIZE_BYTES,
+    DOWNLOAD_TIMEOUT,
+    DOWNLOAD_MAX_CONCURRENCY,
+    DOWNLOAD_MAX_PER_HOST,
+    HTML_PARSER_ENGINE,
+    HTML_PARSE_PROCESSES,
+    HTML_PARSE_CHUNK_SIZE,
+)
+from app.utils.image_cache import ImageCache, CacheEntry, get_image_cache
+from app.services.html_parser import parse_img_tags, parse_srcset, get_parse_process_pool, PARSE_PROCESS_POOL
+from app.services.image_filters import FilterReport, HeaderProbe, filter_by_hints, pixel_dimension
+from collections import deque
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 
-def extract_img_attributes(html: str, base_url: str) -> List[Dict[str, Any]]:
+# Lazy-loading scripts keep the real image in these attributes and a placeholder in src
+LAZY_SRC_ATTRIBUTES = ('data-src', 'data-lazy-src', 'data-original', 'data-lazy', 'data-url')
+LAZY_SRCSET_ATTRIBUTES = ('data-srcset', 'data-lazy-srcset')
+
+# <source type="..."> values the decoders can read
+SUPPORTED_SOURCE_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'image/webp')
+
+
+def is_supported_image_url(url: str) -> bool:
+    """True if the URL's path (query string ignored) has one of the SUPPORTED_IMAGE_FORMATS extensions."""
+    extension = os.path.splitext(urlparse(url).path)[1].lower().lstrip('.')
+    return extension in SUPPORTED_IMAGE_FORMATS
+
+
+def select_image_source(img_attributes: Dict[str, Any], min_width: int = max(TARGET_IMAGE_SIZE)) -> Optional[str]:
+    """
+    Picks the URL to download for one <img>: the smallest candidate at least min_width pixels
+    wide (the model input size), out of src, the lazy-loading attributes, srcset and the
+    sources of an enclosing <picture>. Without a large enough candidate the widest one is used.
+    Candidates of unknown width (no 'w' descriptor or width attribute) are a fallback,
+    lazy-loading attributes first, then src, then the highest-density srcset candidate.
+
+    Returns:
+        The URL as written in the page (possibly relative), or None.
+    """
+    img_width = pixel_dimension(img_attributes.get('width'))
+    candidates = []  # (width or None, density or None, url), in order of preference on ties
+
+    srcsets = [(img_attributes.get(name), None) for name in ('srcset',) + LAZY_SRCSET_ATTRIBUTES]
+    srcsets += [(source.get('srcset') or source.get('data-srcset'), source.get('type'))
+                for source in img_attributes.get('picture_sources') or []]
+    for srcset, source_type in srcsets:
+        if source_type and source_type.lower() not in SUPPORTED_SOURCE_TYPES:
+            continue
+        for url, width, density in parse_srcset(srcset):
+            if width is None and img_width:
+                width = int(img_width * density)
+            candidates.append((width, density, url))
+    for name in LAZY_SRC_ATTRIBUTES + ('src',):
+        candidates.append((img_width, None, img_attributes.get(name)))
+
+    candidates = [candidate for candidate in candidates if candidate[2] and not candidate[2].startswith('data:')]
+    # Prefer formats the decoders read, but never lose an image that has nothing else
+    supported = [candidate for candidate in candidates if is_supported_image_url(candidate[2])]
+    candidates = supported or candidates
+    if not candidates:
+        return None
+
+    sized = [(width, order, url) for order, (width, _, url) in enumerate(candidates) if width is not None]
+    if sized:
+        large_enough = [candidate for candidate in sized if candidate[0] >= min_width]
+        if large_enough:
+            return min(large_enough)[2]
+        return max(sized, key=lambda candidate: (candidate[0], -candidate[1]))[2]
+
+    # Nothing has a known width: the lazy-loading attributes or src, else the densest srcset candidate
+    plain = [url for width, density, url in candidates if density is None]
+    if plain:
+        return plain[0]
+    return max(candidates, key=lambda candidate: candidate[1])[2]
+
+
+def extract_img_attributes(html: str, base_url: str, engine: str = HTML_PARSER_ENGINE) -> List[Dict[str, Any]]:
     """
     Parses the HTML to extract attributes of all <img> tags and processes the 'src' attribute.
-    Filters out duplicate image URLs.
+    'src' is set to the candidate chosen by select_image_source (the page's own src is kept
+    under 'original_src' when it differs). CSS background images are included with a
+    'css_background' key. Filters out duplicate image URLs.
 
     Args:
         html (str): The HTML content.
         base_url (str): The base URL to resolve relative paths in 'src' attributes.
+        engine (str): Parser engine, see parse_img_tags.
 
     Returns:
         list: A list of dictionaries containing unique attributes of each <img> tag.
     """
 
-    # Parse the HTML content
-    soup = BeautifulSoup(html, 'lxml')
-
-    # Find all <img> tags
-    img_tags = soup.find_all('img')
+    # Only the <img> attributes are extracted, no document tree is built;
+    # pages seen before come from the parse cache
+    img_tags = parse_img_tags(html, engine)
 
     # Initialize list to store each img tag's attributes as dictionaries
     img_data = []
     seen_urls = set()  # Keep track of URLs we've already processed
 
     # Loop through each img tag and extract attributes
-    for img in img_tags:
-        img_attributes = img.attrs  # Get all attributes of the img tag as a dictionary
-        img_url = img_attributes.get("src")  # Get the 'src' attribute
+    for img_attributes in img_tags:
+        if 'css_background' in img_attributes:
+            img_url = img_attributes['css_background']
+        else:
+            img_url = select_image_source(img_attributes)
+            if img_url != img_attributes.get("src") and img_attributes.get("src"):
+                img_attributes["original_src"] = img_attributes["src"]
         
         # Convert relative URLs to absolute URLs
         if img_url and urlparse(img_url).scheme == "":
             img_url = urljoin(base_url, img_url)
-            print(f"Converted relative URL to absolute: {img_url}")
 
         # Replace backslashes with forward slashes
         if img_url:
@@ -54,10 +139,144 @@ def extract_img_attributes(html: str, base_url: str) -> List[Dict[str, Any]]:
     return img_data
 
 
+def extract_image_urls(html: str, base_url: str, filter_report: Optional[FilterReport] = None) -> List[str]:
+    """
+    Extracts the image URLs of one HTML page.
+    Keeps only SUPPORTED_IMAGE_FORMATS extensions (query strings are ignored) and excludes 'logo' in filename.
+    Icons, sprites and tracking pixels are dropped by their HTML hints (see filter_by_hints).
+    """
+    # Get image data for this HTML
+    img_data = filter_by_hints(extract_img_attributes(html, base_url), filter_report)
+
+    # Extract URLs and filter by extension and exclude logos
+    return [
+        img.get('src') for img in img_data 
+        if img.get('src') and is_supported_image_url(img.get('src')) and 'logo' not in img.get('src').lower()
+    ]
+
+
+def extract_page_batch(pages: List[tuple]) -> tuple:
+    """
+    Extracts the image URLs of several (html, base_url) pages; runs in the parse worker processes.
+    Returns the URL lists and the pre-download filter counts, which can't be shared across processes.
+    """
+    results = []
+    filter_report = FilterReport()
+    for html, base_url in pages:
+        try:
+            results.append(extract_image_urls(html, base_url, filter_report))
+        except Exception as e:
+            print(f"Error parsing HTML from {base_url}: {e}")
+            results.append([])
+    return results, filter_report.as_dict()
+
+
+def iter_domain_image_data(html_data_list: List[Dict[str, Any]],
+                           max_workers: int = HTML_PARSE_PROCESSES,
+                           chunk_size: int = HTML_PARSE_CHUNK_SIZE,
+                           filter_report: Optional[FilterReport] = None
+                           ) -> Iterator[Dict[str, Any]]:
+    """
+    Parses the pages on a process pool and yields each domain's image data as soon as all of
+    its pages are parsed, so downloads can start before the whole list is done.
+
+    Each domain's URLs are merged into an ordered set (a dict) page by page, in page order,
+    so the result is the same as a serial parse, deduplicated in linear time.
+
+    Args:
+        html_data_list: Same as collect_image_data
+        max_workers: Parse processes; 0 or 1 parses in this process
+        chunk_size: Pages sent to a worker at once
+        filter_report: Collects the counts of the HTML-hint pre-download filter
+
+    Yields:
+        {'domain_id': domain_id, 'images': ['http://...', ...]}, in order of completion
+    """
+    pages = [
+        (index, data['domain_start_id'], data['base_url'][0], data['response_text'][0])
+        for index, data in enumerate(html_data_list)
+    ]
+    page_order = {}  # domain_id -> its page indexes that haven't been merged yet, in order
+    for index, domain_id, _, _ in pages:
+        page_order.setdefault(domain_id, deque()).append(index)
+    parsed = {domain_id: {} for domain_id in page_order}  # page index -> urls, waiting for earlier pages
+    domain_urls = {domain_id: {} for domain_id in page_order}
+
+    def merge(index, domain_id, image_urls):
+        parsed[domain_id][index] = image_urls
+        order = page_order[domain_id]
+        while order and order[0] in parsed[domain_id]:
+            for url in parsed[domain_id].pop(order.popleft()):
+                domain_urls[domain_id][url] = None
+        if not order:
+            return {'domain_id': domain_id, 'images': list(domain_urls.pop(domain_id))}
+        return None
+
+    def parsed_chunk(chunk, batch_result):
+        results, filter_counts = batch_result
+        if filter_report:
+            filter_report.merge(filter_counts)
+        return zip(chunk, results)
+
+    chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+
+    if max_workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            batch_result = extract_page_batch([(html, base_url) for _, _, base_url, html in chunk])
+            for (index, domain_id, _, _), image_urls in parsed_chunk(chunk, batch_result):
+                if (domain_data := merge(index, domain_id, image_urls)):
+                    yield domain_data
+        return
+
+    executor = get_parse_process_pool(max_workers)
+    chunks = iter(chunks)
+    in_flight = {}
+
+    def pool_broke():
+        # A worker died: the pool is replaced for later calls, this one finishes in-process
+        nonlocal executor
+        if executor is not None:
+            PARSE_PROCESS_POOL.reset(executor)
+            executor = None
+
+    def submit_next():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        batch = [(html, base_url) for _, _, base_url, html in chunk]
+        if executor is not None:
+            try:
+                in_flight[executor.submit(extract_page_batch, batch)] = chunk
+                return
+            except BrokenProcessPool:
+                pool_broke()
+        future = Future()
+        future.set_result(extract_page_batch(batch))
+        in_flight[future] = chunk
+
+    # Keep a few chunks per worker queued, instead of pickling every page up front
+    for _ in range(max_workers * 4):
+        submit_next()
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = in_flight.pop(future)
+            submit_next()
+            try:
+                batch_result = future.result()
+            except BrokenProcessPool:
+                pool_broke()
+                batch_result = extract_page_batch([(html, base_url) for _, _, base_url, html in chunk])
+            for (index, domain_id, _, _), image_urls in parsed_chunk(chunk, batch_result):
+                if (domain_data := merge(index, domain_id, image_urls)):
+                    yield domain_data
+
+
 def collect_image_data(html_data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Collects image data from multiple HTML and organizes it by domain ID.
-    Filters images to include only .jpeg, .jpg, .png extensions and excludes 'logo' in filename.
+    Filters images to include only SUPPORTED_IMAGE_FORMATS extensions and excludes 'logo' in filename.
+    Pages are parsed in parallel by iter_domain_image_data.
     
     Args:
         html_data_list: List of dictionaries containing:
@@ -69,45 +288,142 @@ def collect_image_data(html_data_list: List[Dict[str, Any]]) -> List[Dict[str, A
         List of dictionaries with structure: 
         [{'domain_id': domain_id, 'images': ['http://...', 'http://...']}]
     """
-    domain_images = {}
-    valid_extensions = ('.jpeg', '.jpg', '.png')
-    
-    for data in html_data_list:
-        domain_id = data['domain_start_id']
-        base_url = data['base_url'][0]
-        html = data['response_text'][0]
-        
-        # Get image data for this HTML
-        img_data = extract_img_attributes(html, base_url)
-        
-        # Extract URLs and filter by extension and exclude logos
-        image_urls = [
-            img.get('src') for img in img_data 
-            if img.get('src') and (
-                any(img.get('src').lower().endswith(ext) for ext in valid_extensions) and
-                'logo' not in img.get('src').lower()
-            )
-        ]
-        
-        # Add to domain_images dict
-        if domain_id in domain_images:
-            domain_images[domain_id].extend(image_urls)
-            # Remove duplicates while preserving order
-            domain_images[domain_id] = list(dict.fromkeys(domain_images[domain_id]))
-        else:
-            domain_images[domain_id] = image_urls
-    
-    # Convert to final format
-    result = [
-        {'domain_id': domain_id, 'images': images}
-        for domain_id, images in domain_images.items()
-    ]
-    
-    return result
+    filter_report = FilterReport()
+    domain_images = {
+        domain_data['domain_id']: domain_data
+        for domain_data in iter_domain_image_data(html_data_list, filter_report=filter_report)
+    }
+    filter_report.log_summary()
+
+    # Domains in order of first appearance, as before
+    domain_ids = dict.fromkeys(data['domain_start_id'] for data in html_data_list)
+    return [domain_images[domain_id] for domain_id in domain_ids]
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36'
+}
+
+
+def _image_name(img_data: Dict[str, str]) -> Optional[str]:
+    """
+    Validates the image URL and returns the original filename from its path.
+
+    Returns:
+        str: The original filename, or None if the URL should be skipped.
+    """
+    img_url = img_data.get("src")
+
+    if not img_url or urlparse(img_url).scheme not in ["http", "https"]:
+        print(f"Skipping invalid URL: {img_url}")
+        return None
+
+    parsed_url = urlparse(img_url)
+    original_name = os.path.basename(parsed_url.path)
+
+    # Skip if filename is empty
+    if not original_name:
+        print(f"Skipping URL with no filename: {img_url}")
+        return None
+
+    return original_name
+
+
+def _write_file(path: str, content: bytes) -> None:
+    with open(path, "wb") as img_file:
+        img_file.write(content)
+
+
+def _save_image(img_data: Dict[str, str],
+                original_name: str,
+                content: bytes,
+                response_headers,
+                download_folder: str,
+                cache: Optional[ImageCache]
+                ) -> str:
+    """
+    Saves downloaded bytes and sets 'local_path' (and 'sha256' when cached) on img_data.
+    With a cache the bytes are stored by content hash and linked into download_folder.
+    """
+    domain_id = img_data.get("domain_id")
+
+    if cache is None:
+        img_path = os.path.join(download_folder, f"{domain_id}_{original_name}")
+        _write_file(img_path, content)
+    else:
+        sha256 = cache.store(
+            img_data["src"],
+            content,
+            etag=response_headers.get('ETag'),
+            last_modified=response_headers.get('Last-Modified')
+        )
+        img_path = os.path.join(download_folder, ImageCache.local_name(domain_id, sha256, original_name))
+        try:
+            cache.materialize(sha256, img_path)
+        except OSError:
+            # The blob was evicted right after it was stored; the bytes are still at hand
+            _write_file(img_path, content)
+        img_data["sha256"] = sha256
+
+    img_data["local_path"] = img_path
+    return img_path
+
+
+def _use_cached_image(img_data: Dict[str, str],
+                      original_name: str,
+                      entry: CacheEntry,
+                      download_folder: str,
+                      cache: ImageCache,
+                      revalidated: bool = False
+                      ) -> str:
+    """Links a cached image into download_folder and sets 'local_path' and 'sha256' on img_data."""
+    cache.touch(entry, revalidated=revalidated)
+    img_path = os.path.join(download_folder, ImageCache.local_name(img_data.get("domain_id"), entry.sha256, original_name))
+    cache.materialize(entry.sha256, img_path)
+    img_data["local_path"] = img_path
+    img_data["sha256"] = entry.sha256
+    return img_path
+
+
+def _lookup_cached_image(cache: Optional[ImageCache], img_url: str) -> Optional[CacheEntry]:
+    """cache.lookup, treating an unreadable index (e.g. 'database is locked') as a miss."""
+    if cache is None:
+        return None
+    try:
+        return cache.lookup(img_url)
+    except sqlite3.Error as e:
+        print(f"Image cache lookup failed for {img_url}: {e}")
+        return None
+
+
+def _try_cached_image(img_data: Dict[str, str],
+                      original_name: str,
+                      entry: CacheEntry,
+                      download_folder: str,
+                      cache: ImageCache,
+                      revalidated: bool = False
+                      ) -> bool:
+    """
+    _use_cached_image for one image, returning False instead of raising when the cached copy
+    can't be used: its blob was evicted after the lookup, or the index is locked.
+    The caller then downloads the image.
+    """
+    try:
+        _use_cached_image(img_data, original_name, entry, download_folder, cache, revalidated)
+        return True
+    except (OSError, sqlite3.Error) as e:
+        print(f"Cached copy of {img_data.get('src')} is unavailable ({e}), downloading it")
+        img_data.pop("local_path", None)
+        img_data.pop("sha256", None)
+        return False
 
 
 def download_images_with_local_path(dict_list: List[Dict[str, str]], 
-                                    download_folder: str = TEMP_IMAGE_DIR
+                                    download_folder: str = TEMP_IMAGE_DIR,
+                                    use_cache: bool = True,
+                                    probe: bool = False,
+                                    filter_report: Optional[FilterReport] = None,
+                                    cache_lookup: bool = True
                                     ) -> None:
     """
     Downloads images from URLs provided in a list of dictionaries and saves them to a specified local folder.
@@ -118,128 +434,356 @@ def download_images_with_local_path(dict_list: List[Dict[str, str]],
             - 'src': The URL of the image to download.
             - 'domain_id': The ID of the domain associated with the image.
         download_folder (str): The directory where the images will be saved. Defaults to TEMP_IMAGE_DIR.
+        use_cache (bool): Read through the content-addressed image cache. Fresh entries are
+            reused without a request, stale ones are revalidated with ETag/Last-Modified.
+        probe (bool): Abort downloads whose first bytes show the image is too small.
+        filter_report (FilterReport): Collects the probe counts.
+        cache_lookup (bool): False downloads unconditionally (still storing into the cache),
+            for images whose cached copy turned out to be unusable.
 
     Returns:
         None
     """
     os.makedirs(download_folder, exist_ok=True)
-    default_headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36'
-    }
+    cache = get_image_cache() if use_cache else None
     
     # Define timeouts
-    TIMEOUT = (5, 15)  # (connect timeout, read timeout)
+    TIMEOUT = DOWNLOAD_TIMEOUT  # (connect timeout, read timeout)
     
     for img_data in dict_list:
         img_url = img_data.get("src")
-        domain_id = img_data.get("domain_id")
-        
-        if not img_url or urlparse(img_url).scheme not in ["http", "https"]:
-            print(f"Skipping invalid URL: {img_url}")
-            continue
-            
-        parsed_url = urlparse(img_url)
-        original_name = os.path.basename(parsed_url.path)
-        
-        # Skip if filename is empty
+        original_name = _image_name(img_data)
         if not original_name:
-            print(f"Skipping URL with no filename: {img_url}")
             continue
-            
-        img_name = f"{domain_id}_{original_name}"
-        img_path = os.path.join(download_folder, img_name)
-        
-        try:
-            # Try with verification first
-            response = requests.get(
-                img_url, 
-                headers=default_headers, 
-                stream=True, 
-                verify=True,
-                timeout=TIMEOUT
-            )
-            response.raise_for_status()
-            
-            # Check if content type is image
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                print(f"Skipping non-image content type ({content_type}): {img_url}")
-                continue
-                
-            # Check file size before downloading
-            content_length = int(response.headers.get('content-length', 0))
-            if content_length > 10 * 1024 * 1024:  # 10MB limit
-                print(f"Skipping large image ({content_length/1024/1024:.2f}MB): {img_url}")
+
+        entry = _lookup_cached_image(cache, img_url) if cache_lookup else None
+        if entry and entry.is_fresh:
+            if _try_cached_image(img_data, original_name, entry, download_folder, cache):
+                print(f"Using cached image: {img_data['local_path']}")
                 continue
-            
-            with open(img_path, "wb") as img_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        img_file.write(chunk)
-            print(f"Downloaded image: {img_path}")
-            img_data["local_path"] = img_path
-            
-        except requests.exceptions.SSLError:
-            print(f"SSL verification failed for {img_url}, retrying without verification...")
+            entry = None
+
+        headers = {**DEFAULT_HEADERS, **ImageCache.conditional_headers(entry)}
+
+        # Try with verification first, then without
+        for verify in (True, False):
             try:
                 response = requests.get(
                     img_url, 
-                    headers=default_headers, 
+                    headers=headers, 
                     stream=True, 
-                    verify=False,
+                    verify=verify,
                     timeout=TIMEOUT
                 )
+                if response.status_code == 304 and entry:
+                    if _try_cached_image(img_data, original_name, entry, download_folder, cache, revalidated=True):
+                        print(f"Revalidated cached image: {img_data['local_path']}")
+                    else:
+                        download_images_with_local_path([img_data], download_folder, use_cache, probe=probe,
+                                                        filter_report=filter_report, cache_lookup=False)
+                    break
                 response.raise_for_status()
                 
-                with open(img_path, "wb") as img_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            img_file.write(chunk)
-                print(f"Downloaded image (insecure): {img_path}")
-                img_data["local_path"] = img_path
+                # Check if content type is image
+                content_type = response.headers.get('content-type', '')
+                if not content_type.startswith('image/'):
+                    print(f"Skipping non-image content type ({content_type}): {img_url}")
+                    break
+                    
+                # Check file size before downloading
+                content_length = int(response.headers.get('content-length', 0))
+                if content_length > MAX_IMAGE_SIZE_BYTES:  # 10MB limit
+                    print(f"Skipping large image ({content_length/1024/1024:.2f}MB): {img_url}")
+                    break
                 
+                header_probe = HeaderProbe(filter_report) if probe else None
+                chunks = []
+                for chunk in response.iter_content(chunk_size=8192):
+                    if header_probe and not header_probe.feed(chunk):
+                        break
+                    chunks.append(chunk)
+                if header_probe and not header_probe.finish():
+                    response.close()
+                    print(f"Skipping small image: {img_url}")
+                    break
+                content = b"".join(chunks)
+                img_path = _save_image(img_data, original_name, content, response.headers, download_folder, cache)
+                print(f"Downloaded image{'' if verify else ' (insecure)'}: {img_path}")
+                break
+                
+            except requests.exceptions.SSLError as e:
+                if not verify:
+                    print(f"Failed to download image {img_url}: {str(e)}")
+                    break
+                print(f"SSL verification failed for {img_url}, retrying without verification...")
             except requests.exceptions.Timeout:
                 print(f"Timeout downloading image {img_url}")
+                break
             except requests.exceptions.RequestException as e:
                 print(f"Failed to download image {img_url}: {str(e)}")
-                
-        except requests.exceptions.Timeout:
-            print(f"Timeout downloading image {img_url}")
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to download image {img_url}: {str(e)}")
-        except Exception as e:
-            print(f"Unexpected error downloading {img_url}: {str(e)}")
+                break
+            except Exception as e:
+                print(f"Unexpected error downloading {img_url}: {str(e)}")
+                break
+
+    if cache:
+        cache.evict()
+
+
+async def fetch_image(session: aiohttp.ClientSession,
+                       img_data: Dict[str, str],
+                       download_folder: str,
+                       cache: Optional[ImageCache],
+                       verify_ssl: bool = True,
+                       probe: bool = False,
+                       filter_report: Optional[FilterReport] = None,
+                       cache_lookup: bool = True
+                       ) -> None:
+    """
+    Downloads a single image over a shared session and sets 'local_path' on success.
+    Applies the same content-type, size, SSL-fallback and cache rules as the synchronous downloader.
+    With probe, the download is aborted as soon as its first bytes show the image is too small.
+    Failures only affect this image: nothing is raised to the gather/stream running it.
+    """
+    img_url = img_data.get("src")
+    original_name = _image_name(img_data)
+    if not original_name:
+        return
+
+    loop = asyncio.get_running_loop()
+    entry = await loop.run_in_executor(None, _lookup_cached_image, cache, img_url) if cache_lookup else None
+    if entry and entry.is_fresh:
+        if await loop.run_in_executor(
+            None, _try_cached_image, img_data, original_name, entry, download_folder, cache
+        ):
+            print(f"Using cached image: {img_data['local_path']}")
+            return
+        entry = None
+
+    headers = ImageCache.conditional_headers(entry)
 
+    try:
+        async with session.get(img_url, headers=headers, ssl=None if verify_ssl else False) as response:
+            if response.status == 304 and entry:
+                revalidated = await loop.run_in_executor(
+                    None, _try_cached_image, img_data, original_name, entry, download_folder, cache, True
+                )
+                if revalidated:
+                    print(f"Revalidated cached image: {img_data['local_path']}")
+                else:
+                    # A 304 has no body, so fetch the image again without the validators
+                    await fetch_image(session, img_data, download_folder, cache, verify_ssl, probe=probe,
+                                      filter_report=filter_report, cache_lookup=False)
+                return
+            response.raise_for_status()
 
-def download_images(image_data: List[Dict[str, List[str]]], 
-                    temp_dir: str = TEMP_IMAGE_DIR
+            # Check if content type is image
+            content_type = response.headers.get('content-type', '')
+            if not content_type.startswith('image/'):
+                print(f"Skipping non-image content type ({content_type}): {img_url}")
+                return
+
+            # Check file size before downloading
+            content_length = response.content_length or 0
+            if content_length > MAX_IMAGE_SIZE_BYTES:
+                print(f"Skipping large image ({content_length/1024/1024:.2f}MB): {img_url}")
+                return
+
+            # Servers may omit content-length, so enforce the limit while streaming too
+            header_probe = HeaderProbe(filter_report) if probe else None
+            chunks = []
+            received = 0
+            async for chunk in response.content.iter_chunked(8192):
+                received += len(chunk)
+                if received > MAX_IMAGE_SIZE_BYTES:
+                    print(f"Skipping large image (>{MAX_IMAGE_SIZE_BYTES/1024/1024:.2f}MB): {img_url}")
+                    return
+                if header_probe and not header_probe.feed(chunk):
+                    break
+                chunks.append(chunk)
+            if header_probe and not header_probe.finish():
+                # Drops the connection rather than reading the rest of the body
+                response.close()
+                print(f"Skipping small image: {img_url}")
+                return
+            response_headers = response.headers
+
+        img_path = await loop.run_in_executor(
+            None, _save_image, img_data, original_name, b"".join(chunks), response_headers, download_folder, cache
+        )
+        print(f"Downloaded image{'' if verify_ssl else ' (insecure)'}: {img_path}")
+
+    except aiohttp.ClientSSLError:
+        if not verify_ssl:
+            print(f"Failed to download image {img_url}: SSL error")
+            return
+        print(f"SSL verification failed for {img_url}, retrying without verification...")
+        await fetch_image(session, img_data, download_folder, cache, verify_ssl=False, probe=probe,
+                          filter_report=filter_report, cache_lookup=cache_lookup)
+    except asyncio.TimeoutError:
+        print(f"Timeout downloading image {img_url}")
+    except aiohttp.ClientError as e:
+        print(f"Failed to download image {img_url}: {str(e)}")
+    except Exception as e:
+        print(f"Unexpected error downloading {img_url}: {str(e)}")
+
+
+def create_download_session(max_concurrency: int = DOWNLOAD_MAX_CONCURRENCY,
+                            max_per_host: int = DOWNLOAD_MAX_PER_HOST
+                            ) -> aiohttp.ClientSession:
+    """
+    Creates the shared image download session. Connections (and TLS handshakes) are pooled
+    and reused per host; concurrency is capped globally and per host by the connector.
+    """
+    connect_timeout, read_timeout = DOWNLOAD_TIMEOUT
+    timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+    connector = aiohttp.TCPConnector(
+        limit=max_concurrency,
+        limit_per_host=max_per_host,
+        ttl_dns_cache=300
+    )
+    return aiohttp.ClientSession(
+        headers=DEFAULT_HEADERS,
+        connector=connector,
+        timeout=timeout
+    )
+
+
+async def download_images_async(dict_list: List[Dict[str, str]],
+                                download_folder: str = TEMP_IMAGE_DIR,
+                                max_concurrency: int = DOWNLOAD_MAX_CONCURRENCY,
+                                max_per_host: int = DOWNLOAD_MAX_PER_HOST,
+                                use_cache: bool = True
+                                ) -> None:
+    """
+    Asynchronous counterpart of download_images_with_local_path.
+    All requests share one session, so connections (and TLS handshakes) are pooled and
+    reused per host. Concurrency is capped globally and per host by the connector.
+
+    Args:
+        dict_list (List[Dict[str, str]]): Dictionaries with 'src' and 'domain_id' keys.
+            'local_path' is added to every dictionary whose image was downloaded.
+        download_folder (str): The directory where the images will be saved.
+        max_concurrency (int): Maximum number of open connections overall.
+        max_per_host (int): Maximum number of open connections to a single host.
+        use_cache (bool): Read through the content-addressed image cache.
+
+    Returns:
+        None
+    """
+    os.makedirs(download_folder, exist_ok=True)
+    cache = get_image_cache() if use_cache else None
+
+    async with create_download_session(max_concurrency, max_per_host) as session:
+        await asyncio.gather(*[
+            fetch_image(session, img_data, download_folder, cache)
+            for img_data in dict_list
+        ])
+
+    if cache:
+        await asyncio.get_running_loop().run_in_executor(None, cache.evict)
+
+
+async def download_domains_async(image_data: Iterable[Dict[str, List[str]]],
+                                 download_folder: str = TEMP_IMAGE_DIR,
+                                 max_concurrency: int = DOWNLOAD_MAX_CONCURRENCY,
+                                 max_per_host: int = DOWNLOAD_MAX_PER_HOST,
+                                 use_cache: bool = True,
+                                 filter_report: Optional[FilterReport] = None
+                                 ) -> List[Dict[str, str]]:
+    """
+    Like download_images_async, but takes domain results as they are produced: the downloads
+    of a domain start as soon as it is pulled from image_data (e.g. iter_domain_image_data),
+    while later domains are still being parsed. A download is aborted once its first bytes
+    show the image is too small (counted in filter_report).
+
+    Returns:
+        List of dictionaries with 'src' and 'domain_id' keys, in the order they were pulled;
+        'local_path' is set on the ones that were downloaded.
+    """
+    os.makedirs(download_folder, exist_ok=True)
+    cache = get_image_cache() if use_cache else None
+    loop = asyncio.get_running_loop()
+    domains = iter(image_data)
+    images = []
+    tasks = []
+
+    async with create_download_session(max_concurrency, max_per_host) as session:
+        # The iterator may block on parsing, so it's advanced off the event loop
+        while (domain_data := await loop.run_in_executor(None, next, domains, None)) is not None:
+            for url in domain_data['images']:
+                img_data = {'src': url, 'domain_id': domain_data['domain_id']}
+                images.append(img_data)
+                tasks.append(asyncio.create_task(
+                    fetch_image(session, img_data, download_folder, cache, probe=True, filter_report=filter_report)
+                ))
+        await asyncio.gather(*tasks)
+
+    if cache:
+        await loop.run_in_executor(None, cache.evict)
+    return images
+
+
+def download_images(image_data: Iterable[Dict[str, List[str]]], 
+                    temp_dir: str = TEMP_IMAGE_DIR,
+                    use_async: bool = True,
+                    filter_report: Optional[FilterReport] = None
                     ) -> List[Dict[str, Any]]:
     """
     Downloads all images from the collected image data.
+
+    Coroutines should await download_all_images_async instead; when this is called while an event
+    loop is running in the thread, the download runs on a new loop in a worker thread.
     
     Args:
-        image_data: List of dictionaries with structure {'domain_id': id, 'images': [urls]}
+        image_data: Dictionaries with structure {'domain_id': id, 'images': [urls]}; a list from
+            collect_image_data, or the iter_domain_image_data generator to overlap parsing and downloading
         temp_dir: Directory to store downloaded images
+        use_async: Download all domains concurrently over pooled connections.
+            Set to False to fall back to the sequential requests-based downloader.
+        filter_report: Collects the counts of the image-size pre-filter; without one,
+            the counts are logged at the end
         
     Returns:
         List of dictionaries containing downloaded image information
     """
-    downloaded_images = []
-    
-    for domain_data in image_data:
-        domain_id = domain_data['domain_id']
-        image_urls = domain_data['images']
-        
+    download = download_all_images_async(image_data, temp_dir, use_async, filter_report)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(download)
+
+    # asyncio.run refuses to nest inside a running loop
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, download).result()
+
+
+async def download_all_images_async(image_data: Iterable[Dict[str, List[str]]],
+                                    temp_dir: str = TEMP_IMAGE_DIR,
+                                    use_async: bool = True,
+                                    filter_report: Optional[FilterReport] = None
+                                    ) -> List[Dict[str, Any]]:
+    """Coroutine version of download_images, for callers that already run an event loop."""
+    log_filter_report = filter_report is None
+    filter_report = filter_report or FilterReport()
+
+    # Download images with domain-specific names
+    if use_async:
+        images_to_download = await download_domains_async(image_data, temp_dir, filter_report=filter_report)
+    else:
         # Create list of dicts with URLs and domain_id
         images_to_download = [
-            {'src': url, 'domain_id': domain_id}
-            for url in image_urls
+            {'src': url, 'domain_id': domain_data['domain_id']}
+            for domain_data in image_data
+            for url in domain_data['images']
         ]
-        
-        # Download images with domain-specific names
-        download_images_with_local_path(images_to_download, temp_dir)
-        
-        # Filter out failed downloads
-        downloaded_images.extend([img for img in images_to_download if img.get("local_path")])
-    
-    return downloaded_images
\ No newline at end of file
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(download_images_with_local_path, images_to_download, temp_dir,
+                          probe=True, filter_report=filter_report)
+        )
+
+    if log_filter_report:
+        filter_report.log_summary()
+
+    # Filter out failed downloads
+    return [img for img in images_to_download if img.get("local_path")]
@@ -0,0 +1,263 @@
+import re
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from app.config import HTML_PARSER_ENGINE, HTML_PARSE_CACHE_MAX_ENTRIES
+from app.utils.process_pool import ForkedProcessPool
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is optional, lxml is always installed
+    LexborHTMLParser = None
+
+
+_CSS_BACKGROUND = re.compile(r"background(?:-image)?\s*:([^;}]*)", re.IGNORECASE)
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)""", re.IGNORECASE)
+
+
+def css_background_urls(css: str) -> List[str]:
+    """URLs of the background / background-image declarations in a style attribute or <style> block."""
+    if not css or 'url(' not in css.lower():
+        return []
+    return [
+        url.strip()
+        for declaration in _CSS_BACKGROUND.findall(css)
+        for _, url in _CSS_URL.findall(declaration)
+        if url.strip()
+    ]
+
+
+def parse_srcset(srcset: str) -> List[Tuple[str, Optional[int], Optional[float]]]:
+    """
+    Splits a srcset into (url, width, density) candidates; width comes from a 'w' descriptor,
+    density from an 'x' descriptor (a candidate without descriptors is 1x).
+    URLs may contain commas (e.g. image CDN transformations), only ', ' separates candidates.
+    """
+    candidates = []
+    for match in re.finditer(r"\s*(\S+?)(,+(?=\s|$)|\s+([^,]*)(?:,|$)|$)", srcset or ''):
+        url, descriptors = match.group(1), (match.group(3) or '').strip()
+        if not url or url == ',':
+            continue
+        width, density = None, None
+        for descriptor in descriptors.split():
+            try:
+                if descriptor.endswith('w'):
+                    width = int(descriptor[:-1])
+                elif descriptor.endswith('x'):
+                    density = float(descriptor[:-1])
+            except ValueError:
+                pass
+        if width is None and density is None:
+            density = 1.0
+        candidates.append((url, width, density))
+    return candidates
+
+
+def _background_entries(urls: List[str]) -> List[Dict[str, str]]:
+    return [{'css_background': url} for url in urls]
+
+
+class _ImgTarget:
+    """
+    lxml parser target: keeps the attributes of <img> start tags and builds no tree.
+    The <source> tags of an enclosing <picture> are attached as 'picture_sources'; CSS
+    background images are collected separately, style attributes before <style> blocks
+    like the other engines.
+    """
+    def __init__(self):
+        self.images = []
+        self.backgrounds = []
+        self.style_backgrounds = []
+        self._pictures = []
+        self._style = None
+
+    def start(self, tag, attrib):
+        if tag == 'img':
+            attributes = _split_class(dict(attrib))
+            if self._pictures:
+                attributes['picture_sources'] = list(self._pictures[-1])
+            self.images.append(attributes)
+        elif tag == 'picture':
+            self._pictures.append([])
+        elif tag == 'source' and self._pictures:
+            self._pictures[-1].append(_split_class(dict(attrib)))
+        elif tag == 'style':
+            self._style = []
+        if 'style' in attrib:
+            self.backgrounds.extend(css_background_urls(attrib['style']))
+
+    def end(self, tag):
+        if tag == 'picture' and self._pictures:
+            self._pictures.pop()
+        elif tag == 'style' and self._style is not None:
+            self.style_backgrounds.extend(css_background_urls(''.join(self._style)))
+            self._style = None
+
+    def data(self, data):
+        if self._style is not None:
+            self._style.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return self.images + _background_entries(self.backgrounds + self.style_backgrounds)
+
+
+def _split_class(attributes: Dict[str, str]) -> Dict[str, str]:
+    # BeautifulSoup returns class as a list of names; keep the engines interchangeable
+    if isinstance(attributes.get('class'), str):
+        attributes['class'] = attributes['class'].split()
+    return attributes
+
+
+def parse_img_tags_lxml(html: str) -> List[Dict[str, str]]:
+    target = _ImgTarget()
+    parser = etree.HTMLParser(target=target, recover=True, no_network=True)
+    try:
+        parser.feed(html)
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass  # Nothing parseable (e.g. whitespace only); keep what was found
+    return target.close()
+
+
+def parse_img_tags_selectolax(html: str) -> List[Dict[str, str]]:
+    def attributes_of(node):
+        return _split_class({name: value if value is not None else '' for name, value in node.attributes.items()})
+
+    tree = LexborHTMLParser(html)
+    images = []
+    for node in tree.css('img'):
+        attributes = attributes_of(node)
+        if node.parent is not None and node.parent.tag == 'picture':
+            attributes['picture_sources'] = [attributes_of(source) for source in node.parent.css('source')]
+        images.append(attributes)
+
+    backgrounds = [url for node in tree.css('[style]') for url in css_background_urls(node.attributes.get('style'))]
+    backgrounds += [url for node in tree.css('style') for url in css_background_urls(node.text())]
+    return images + _background_entries(backgrounds)
+
+
+def parse_img_tags_bs4(html: str) -> List[Dict[str, str]]:
+    soup = BeautifulSoup(html, 'lxml')
+    images = []
+    for img in soup.find_all('img'):
+        attributes = img.attrs
+        # The lxml builder nests the <img> in the preceding <source> (it doesn't know <source> is
+        # void), so the <picture> isn't necessarily the parent
+        picture = img.find_parent('picture')
+        if picture is not None:
+            attributes['picture_sources'] = [dict(source.attrs) for source in picture.find_all('source')]
+        images.append(attributes)
+
+    backgrounds = [url for node in soup.find_all(style=True) for url in css_background_urls(node['style'])]
+    backgrounds += [url for node in soup.find_all('style') for url in css_background_urls(node.get_text())]
+    return images + _background_entries(backgrounds)
+
+
+PARSER_ENGINES = {
+    'lxml': parse_img_tags_lxml,
+    'selectolax': parse_img_tags_selectolax,
+    'bs4': parse_img_tags_bs4,
+}
+
+
+class ParseCache:
+    """
+    In-memory LRU of extracted <img> attributes keyed by the hash of the page's HTML.
+    Crawls contain many identical pages (error pages, parked domains, repeated templates),
+    which are parsed only once.
+    """
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def html_key(html: str, engine: str) -> str:
+        digest = hashlib.blake2b(html.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+        return f"{engine}:{digest}"
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+_parse_cache = ParseCache(HTML_PARSE_CACHE_MAX_ENTRIES)
+
+
+def parse_img_tags(html: str, engine: str = HTML_PARSER_ENGINE, use_cache: bool = True) -> List[Dict[str, str]]:
+    """
+    Returns the attributes of every <img> tag in a page, in document order, followed by one
+    {'css_background': url} entry per CSS background image. An <img> inside a <picture> has
+    the attributes of the picture's <source> tags under 'picture_sources'.
+
+    Args:
+        engine: 'lxml' (streaming parser target, no tree), 'selectolax' (falls back to 'lxml'
+            if it is not installed) or 'bs4' (full BeautifulSoup tree)
+        use_cache: Look the page up in the parse cache by its HTML hash first
+
+    Returns:
+        A fresh list of fresh dicts, so callers may modify them.
+    """
+    if engine == 'selectolax' and LexborHTMLParser is None:
+        engine = 'lxml'
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f"Unknown HTML parser engine '{engine}'. Available: {list(PARSER_ENGINES)}")
+    if not html:
+        return []
+
+    key = ParseCache.html_key(html, engine) if use_cache else None
+    images = _parse_cache.get(key) if key else None
+    if images is None:
+        images = PARSER_ENGINES[engine](html)
+        if key:
+            _parse_cache.set(key, images)
+    return [_copy_attributes(attributes) for attributes in images]
+
+
+def _copy_attributes(attributes: Dict[str, str]) -> Dict[str, str]:
+    attributes = dict(attributes)
+    if 'picture_sources' in attributes:
+        attributes['picture_sources'] = [dict(source) for source in attributes['picture_sources']]
+    return attributes
+
+
+def get_parse_cache() -> ParseCache:
+    return _parse_cache
+
+
+# Each worker keeps its own parse cache. Servers fork the workers at startup
+# (app.utils.process_pool.start_process_pools), before any thread holds the cache's lock.
+PARSE_PROCESS_POOL = ForkedProcessPool("HTML parse")
+
+
+def get_parse_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Returns the process-wide HTML parse pool, forking it if it wasn't started yet."""
+    return PARSE_PROCESS_POOL.get(max_workers)
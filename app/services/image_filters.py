@@ -0,0 +1,151 @@
+import re
+import logging
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.config import (
+    PREFILTER_MIN_DIMENSION,
+    PREFILTER_KEYWORDS,
+    PREFILTER_TRACKING_HOSTS,
+    PREFILTER_PROBE,
+    PREFILTER_PROBE_BYTES,
+)
+from app.utils.image_headers import image_dimensions
+
+# Tracking pixels are declared 1x1 (sometimes 0x0 or 2x2)
+TRACKING_PIXEL_MAX_DIMENSION = 2
+
+
+class FilterReport:
+    """Counts of the images each pre-download rule dropped, and of the images that were checked."""
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, rule: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[rule] += n
+
+    def merge(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            self.counts.update(counts)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def log_summary(self) -> None:
+        """Logs the counts at INFO level; callers return them with their results as well."""
+        counts = self.as_dict()
+        filtered = {rule: n for rule, n in counts.items() if rule not in ('checked', 'probed')}
+        rules = ", ".join(f"{rule}: {n}" for rule, n in sorted(filtered.items(), key=lambda item: -item[1]))
+        logging.info(f"Pre-download filter: checked {counts.get('checked', 0)}, probed {counts.get('probed', 0)}, "
+                     f"filtered {sum(filtered.values())} ({rules or 'none'})")
+
+
+def pixel_dimension(value) -> Optional[int]:
+    """width="600" or width="600px" as an int; percentages and other units say nothing about the file."""
+    value = str(value or '').strip().lower()
+    if value.endswith('px'):
+        value = value[:-2].strip()
+    return int(value) if value.isdigit() else None
+
+
+def _words(value) -> set:
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(value)
+    return set(re.split(r'[^a-z0-9]+', str(value or '').lower()))
+
+
+def hint_rule(img_attributes: Dict[str, Any], min_dimension: int = PREFILTER_MIN_DIMENSION) -> Optional[str]:
+    """
+    Name of the first HTML-hint rule an image fails, or None to keep it:
+    - 'tracking_pixel': declared at most 2x2 pixels, or served by a known tracking host
+    - 'small_declared_size': width or height attribute below min_dimension
+    - 'icon_or_sprite': a PREFILTER_KEYWORDS word in the class, alt or file name
+    """
+    src = img_attributes.get('src') or ''
+    parsed = urlparse(src)
+    width = pixel_dimension(img_attributes.get('width'))
+    height = pixel_dimension(img_attributes.get('height'))
+
+    host = parsed.netloc.lower()
+    if any(host == tracker or host.endswith('.' + tracker) for tracker in PREFILTER_TRACKING_HOSTS):
+        return 'tracking_pixel'
+    if width is not None and height is not None and max(width, height) <= TRACKING_PIXEL_MAX_DIMENSION:
+        return 'tracking_pixel'
+    if (width is not None and width < min_dimension) or (height is not None and height < min_dimension):
+        return 'small_declared_size'
+
+    words = _words(img_attributes.get('class')) | _words(img_attributes.get('alt'))
+    words |= _words(parsed.path.rsplit('/', 1)[-1])
+    if words & set(PREFILTER_KEYWORDS):
+        return 'icon_or_sprite'
+    return None
+
+
+def filter_by_hints(img_data: List[Dict[str, Any]], report: Optional[FilterReport] = None,
+                    min_dimension: int = PREFILTER_MIN_DIMENSION) -> List[Dict[str, Any]]:
+    """Drops icons, sprites and tracking pixels using the attributes collected by extract_img_attributes."""
+    kept = []
+    counts = Counter(checked=len(img_data))
+    for img_attributes in img_data:
+        rule = hint_rule(img_attributes, min_dimension)
+        if rule:
+            counts[rule] += 1
+        else:
+            kept.append(img_attributes)
+    if report:
+        report.merge(counts)
+    return kept
+
+
+def _is_too_small(dimensions: Optional[Tuple[int, int]], min_dimension: int) -> bool:
+    # Unknown dimensions (unsupported format, header cut off) keep the image
+    return dimensions is not None and min(dimensions) < min_dimension
+
+
+class HeaderProbe:
+    """
+    Reads an image's dimensions from the first bytes of its download as they stream in, so a
+    too small image is dropped after its first chunks instead of costing a separate request.
+
+    feed() every chunk and abort the response once it returns False; call finish() when the
+    body ended before the dimensions were found (files shorter than probe_bytes).
+    """
+    def __init__(self, report: Optional[FilterReport] = None,
+                 min_dimension: int = PREFILTER_MIN_DIMENSION,
+                 probe_bytes: int = PREFILTER_PROBE_BYTES):
+        self.report = report
+        self.min_dimension = min_dimension
+        self.probe_bytes = probe_bytes
+        self.header = b''
+        self.done = not PREFILTER_PROBE
+        self.passed = True
+
+    def feed(self, chunk: bytes) -> bool:
+        """False if the bytes so far show the image is smaller than min_dimension on either side."""
+        if self.done:
+            return self.passed
+        self.header += chunk[:self.probe_bytes - len(self.header)]
+        dimensions = image_dimensions(self.header)
+        if dimensions is None and len(self.header) < self.probe_bytes:
+            return True
+        return self._decide(dimensions)
+
+    def finish(self) -> bool:
+        """The verdict, deciding on the bytes received if feed() hasn't yet."""
+        if self.done:
+            return self.passed
+        return self._decide(image_dimensions(self.header))
+
+    def _decide(self, dimensions: Optional[Tuple[int, int]]) -> bool:
+        self.done = True
+        if self.report:
+            self.report.add('probed')
+        self.passed = not _is_too_small(dimensions, self.min_dimension)
+        if self.report and not self.passed:
+            self.report.add('small_probed_size')
+        return self.passed
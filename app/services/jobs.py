@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.config import JOB_STORE_PATH, JOB_MAX_CONCURRENCY
+
+ORPHANED_JOB_ERROR = 'Interrupted: the worker process running this job stopped'
+
+
+def _is_other_live_process(pid: int) -> bool:
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """
+    SQLite-backed job records. Status and results are readable from every worker process,
+    so a status request doesn't have to reach the worker that runs the job.
+    """
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    partial_result TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner INTEGER
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'owner' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+
+    @contextmanager
+    def _connect(self):
+        # `with sqlite3.connect()` only commits, so the connection is closed explicitly
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, kind: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, created_at, owner) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, time.time(), os.getpid())
+            )
+        return job_id
+
+    def fail_orphaned_jobs(self) -> int:
+        """
+        Marks the queued and running jobs of worker processes that are gone as failed.
+        They only existed in that process's memory, so nothing would ever finish them.
+        The jobs of this process's pid count as orphaned too: a new process has none yet,
+        so they belong to an earlier process that had the same pid.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, owner FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            orphaned = [job_id for job_id, owner in rows if owner is None or not _is_other_live_process(owner)]
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?",
+                [(ORPHANED_JOB_ERROR, time.time(), job_id) for job_id in orphaned]
+            )
+        return len(orphaned)
+
+    def update(self, job_id: str, **fields) -> None:
+        for key in ('progress', 'partial_result', 'result'):
+            if key in fields:
+                fields[key] = json.dumps(fields[key])
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        for key in ('progress', 'partial_result', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+
+class JobManager:
+    """
+    Runs long jobs in the background with at most max_concurrency running at once in this
+    process (every gunicorn worker has its own manager); the rest wait in the executor's
+    in-process queue, so they are lost with the process. On startup the manager fails the
+    jobs that earlier processes left queued or running.
+    """
+    def __init__(self, store: JobStore = None, max_concurrency: int = JOB_MAX_CONCURRENCY):
+        self.store = store or JobStore()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="job")
+        orphaned = self.store.fail_orphaned_jobs()
+        if orphaned:
+            print(f"Marked {orphaned} job(s) of stopped worker processes as failed")
+
+    def submit(self, kind: str, fn: Callable, *args) -> str:
+        """
+        Queues fn(*args, on_progress=...) and returns the job id.
+        fn reports progress by calling on_progress(progress, partial_result).
+        """
+        job_id = self.store.create(kind)
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args) -> None:
+        self.store.update(job_id, status='running', started_at=time.time())
+
+        def on_progress(progress: Dict[str, Any], partial_result: Any = None):
+            fields = {'progress': progress}
+            if partial_result is not None:
+                fields['partial_result'] = partial_result
+            self.store.update(job_id, **fields)
+
+        try:
+            result = fn(*args, on_progress=on_progress)
+            self.store.update(job_id, status='done', result=result, finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self.store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Returns the process-wide job manager."""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager()
+    return _job_manager
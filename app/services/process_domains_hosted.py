@@ -1,17 +1,28 @@
+import asyncio
+
 from app.loaders import ModelLoader
-from app.utils import collect_image_data, download_images
+from app.services.extract_images import iter_domain_image_data, download_images
+from app.services.image_filters import FilterReport
 from app.config import TEMP_IMAGE_DIR
+from app.utils.temp_gc import maybe_collect_temp_garbage
 from typing import List, Dict, Any
 
-async def process_images_hosted(data_list: List[Dict[str, Any]], categories: List[str]):
+async def process_images_hosted(data_list: List[Dict[str, Any]], categories: List[str], images_per_request: int = 1):
     
-    # Collect and download images
-    image_data = collect_image_data(data_list['data'])
-    downloaded_images = download_images(image_data, TEMP_IMAGE_DIR)
+    # Collect and download images: domains are parsed on the parse pool and downloaded as they finish
+    # Icons, sprites and tracking pixels are dropped before download (HTML hints, then the first downloaded bytes)
+    filter_report = FilterReport()
+    image_data = iter_domain_image_data(data_list['data'], filter_report=filter_report)
+    # download_images drives its own event loop, so keep it off the running one
+    downloaded_images = await asyncio.to_thread(
+        download_images, image_data, TEMP_IMAGE_DIR, filter_report=filter_report
+    )
+    filter_report.log_summary()
     
     # Process images with specified model
     model = ModelLoader(model_type="hosted")
     image_paths = [img["local_path"] for img in downloaded_images]
-    results = await model.model.predict_batch(image_paths, categories=categories)
+    results = await model.model.predict_batch(image_paths, categories=categories, images_per_request=images_per_request)
 
+    maybe_collect_temp_garbage()
     return results
\ No newline at end of file
@@ -1,27 +1,46 @@
 import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
 
-from app.services.extract_images import collect_image_data, download_images
-from app.core.image_models import MoondreamProcessor
-from app.loaders import ImageLoader
+from app.services.extract_images import extract_page_batch, create_download_session, fetch_image
+from app.services.image_filters import FilterReport
+from app.services.html_parser import get_parse_process_pool, PARSE_PROCESS_POOL
+from app.core.model_registry import get_model
+from app.core.near_duplicates import NearDuplicateIndex, NEAR_DUPLICATE_DEDUP
+from app.loaders import load_and_preprocess_image
+from app.loaders.loaders import IMAGE_EXTENSIONS
+from app.loaders.shared_decoding import decode_in_process_pool
+from app.utils.image_cache import get_image_cache
+from app.utils.temp_gc import maybe_collect_temp_garbage
 
-from app.config import TEMP_IMAGE_DIR
+from app.config import TEMP_IMAGE_DIR, TARGET_IMAGE_SIZE, PIPELINE_WORKERS, PIPELINE_QUEUE_SIZES, IMAGE_DECODE_PROCESSES, \
+    HTML_PARSE_PROCESSES
 
 import time
 # Producer: Loads image batches and sends them to the queue
 async def producer(image_loader, batch_size, queue):
-    for batch in image_loader.batch_images(batch_size):
+    # Batches are decoded lazily, so pull them off the event loop
+    loop = asyncio.get_running_loop()
+    batches = image_loader.batch_images(batch_size)
+    while (batch := await loop.run_in_executor(None, next, batches, None)) is not None:
         await queue.put(batch)
     # Signal that we're done
     await queue.put(None)
 
 # Consumer: Pulls batches from the queue and runs model inference
-async def consumer(queue, moondream_processor, categories):
+async def consumer(queue, moondream_processor, categories, on_batch=None, deduplicate=NEAR_DUPLICATE_DEDUP):
     # Initialize statistics
     stats = {
         'total_images': 0,
         'categories': {category: 0 for category in categories},
         'per_route': {}
     }
+    # Near-duplicates (same photo, other size or URL) are inferred once per cluster
+    near_duplicates = NearDuplicateIndex() if deduplicate else None
+    loop = asyncio.get_running_loop()
     
     while True:
         batch = await queue.get()
@@ -29,8 +48,15 @@ async def consumer(queue, moondream_processor, categories):
             # No more data, exit
             break
             
-        # Run the async method directly (no need for run_in_executor)
-        results = await moondream_processor.process_batch(batch, categories)
+        if near_duplicates:
+            # Hashing is CPU work, keep it off the event loop
+            unique_batch, duplicate_of = await loop.run_in_executor(None, near_duplicates.split, batch)
+            results = await moondream_processor.process_batch(unique_batch, categories) if unique_batch[0] else {}
+            near_duplicates.record(results)
+            results = near_duplicates.fan_out(batch[0], results, duplicate_of)
+        else:
+            # Run the async method directly (no need for run_in_executor)
+            results = await moondream_processor.process_batch(batch, categories)
 
         # Update statistics
         for filename, answers in results.items():
@@ -50,23 +76,17 @@ async def consumer(queue, moondream_processor, categories):
                 if answer:  # If answer is True/positive
                     stats['categories'][category] += 1
                     stats['per_route'][route]['categories'][category] += 1
+
+        if near_duplicates:
+            stats['near_duplicates'] = near_duplicates.stats()
+
+        if on_batch:
+            on_batch(stats)
                     
     # Return final statistics
     return stats
 
-# The main entry point tying it all together
-async def process_domains_moondream(image_loader, moondream_processor, categories, batch_size=2):
-    # Create an asyncio queue
-    q = asyncio.Queue()
-
-    # Create the producer and consumer tasks
-    prod_task = asyncio.create_task(producer(image_loader, batch_size, q))
-    cons_task = asyncio.create_task(consumer(q, moondream_processor, categories))
-
-    # Wait until both are done and get final statistics
-    await prod_task
-    stats = await cons_task
-    
+def print_summary(stats, moondream_processor):
     # Enhanced statistics output
     print("\n=== Processing Summary ===")
     print(f"\nTotal images processed: {stats['total_images']}")
@@ -95,22 +115,235 @@ async def process_domains_moondream(image_loader, moondream_processor, categorie
         for category, count in data['categories'].items():
             percentage = (count / data['count']) * 100 if data['count'] > 0 else 0
             print(f"  {category.title()}: {count} ({percentage:.1f}%)")
+
+    # Performance numbers go to the log; they are also returned in the stats
+    if stats.get('near_duplicates', {}).get('duplicates'):
+        near_duplicates = stats['near_duplicates']
+        logging.info(f"Near-duplicates answered from their cluster: {near_duplicates['duplicates']} "
+                     f"({near_duplicates['clusters']} clusters, largest {near_duplicates['largest_cluster']} images)")
+    executor_stats = moondream_processor.executor.stats()
+    logging.info(
+        f"Inference executor: {executor_stats['workers']} workers ({executor_stats['torch_threads']} torch threads), "
+        f"{executor_stats['completed_jobs']} jobs, "
+        f"queue wait p50/p95 {executor_stats['queue_wait']['p50']:.3f}s / {executor_stats['queue_wait']['p95']:.3f}s, "
+        f"execution p50/p95 {executor_stats['execution']['p50']:.3f}s / {executor_stats['execution']['p95']:.3f}s"
+    )
+
+
+# The main entry point tying it all together
+async def process_domains_moondream(image_loader, moondream_processor, categories, batch_size=2, on_batch=None):
+    # Create a bounded asyncio queue, so the producer stays at most a few batches ahead
+    q = asyncio.Queue(maxsize=max(1, image_loader.prefetch_batches))
+
+    # Create the producer and consumer tasks
+    prod_task = asyncio.create_task(producer(image_loader, batch_size, q))
+    cons_task = asyncio.create_task(consumer(q, moondream_processor, categories, on_batch))
+
+    # Wait until both are done and get final statistics
+    await prod_task
+    stats = await cons_task
     
+    print_summary(stats, moondream_processor)
     return stats
 
 
-def process_domains_moondream_service(data, categories):
+class QueueMonitor:
+    """Samples the depth of the pipeline queues while it runs."""
+    def __init__(self, queues, interval=0.1):
+        self.queues = queues
+        self.interval = interval
+        self.samples = {name: [] for name in queues}
+
+    async def run(self):
+        while True:
+            for name, queue in self.queues.items():
+                self.samples[name].append(queue.qsize())
+            await asyncio.sleep(self.interval)
+
+    def summary(self):
+        return {
+            name: {
+                'capacity': self.queues[name].maxsize,
+                'max_depth': max(samples, default=0),
+                'mean_depth': round(sum(samples) / len(samples), 2) if samples else 0,
+            }
+            for name, samples in self.samples.items()
+        }
+
+
+# Stage 1: Parses HTML pages (shared iterator) and emits each new image URL once per domain.
+# executor None parses on the shared parse process pool.
+async def parse_worker(pages, executor, url_queue, seen_urls, counters, filter_report):
+    loop = asyncio.get_running_loop()
+    for page in pages:
+        domain_id = page['domain_start_id']
+        batch = [(page['response_text'][0], page['base_url'][0])]
+        pool = executor or get_parse_process_pool(HTML_PARSE_PROCESSES)
+        try:
+            try:
+                results, filter_counts = await loop.run_in_executor(pool, extract_page_batch, batch)
+            except BrokenProcessPool:
+                # A parse worker died: replace the pool for the next pages, parse this one on a thread
+                PARSE_PROCESS_POOL.reset(pool)
+                results, filter_counts = await loop.run_in_executor(None, extract_page_batch, batch)
+        except Exception as e:
+            print(f"Error parsing HTML for domain {domain_id}: {e}")
+            continue
+        image_urls = results[0]
+        filter_report.merge(filter_counts)
+        counters['html_pages'] += 1
+
+        domain_seen = seen_urls.setdefault(domain_id, set())
+        for url in image_urls:
+            if url in domain_seen:
+                continue
+            domain_seen.add(url)
+            counters['image_urls'] += 1
+            await url_queue.put({'src': url, 'domain_id': domain_id})
+
+
+# Stage 2: Downloads images over the shared session (too small ones are aborted after their first bytes)
+async def download_worker(session, cache, url_queue, downloaded_queue, counters, filter_report):
+    while (img_data := await url_queue.get()) is not None:
+        await fetch_image(session, img_data, TEMP_IMAGE_DIR, cache, probe=True, filter_report=filter_report)
+        if img_data.get('local_path'):
+            counters['downloaded'] += 1
+            await downloaded_queue.put(img_data['local_path'])
+
+
+# Stage 3: Decodes and resizes downloaded files
+async def decode_worker(executor, downloaded_queue, decoded_queue, counters):
+    loop = asyncio.get_running_loop()
+    while (image_path := await downloaded_queue.get()) is not None:
+        if not image_path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        if IMAGE_DECODE_PROCESSES:
+            # Decoded in a worker process, the pixels come back through shared memory
+            result = await decode_in_process_pool(image_path, TARGET_IMAGE_SIZE, IMAGE_DECODE_PROCESSES)
+        else:
+            result = await loop.run_in_executor(executor, load_and_preprocess_image, image_path, TARGET_IMAGE_SIZE)
+        if result:
+            counters['decoded'] += 1
+            await decoded_queue.put(result)
+
+
+# Groups decoded images into (filenames, images) batches for the consumer
+async def batcher(decoded_queue, batch_queue, batch_size):
+    batch = []
+    while (item := await decoded_queue.get()) is not None:
+        batch.append(item)
+        if len(batch) == batch_size:
+            await batch_queue.put(tuple(zip(*batch)))
+            batch = []
+    if batch:
+        await batch_queue.put(tuple(zip(*batch)))
+    await batch_queue.put(None)
+
+
+async def _run_stage(workers, next_queue, next_stage_workers):
+    """Waits for a stage's workers, then sends one end-of-stream sentinel per worker of the next stage."""
+    await asyncio.gather(*workers)
+    for _ in range(next_stage_workers):
+        await next_queue.put(None)
+
+
+async def stream_domains_moondream(data, moondream_processor, categories, batch_size=2, on_progress=None,
+                                   workers=PIPELINE_WORKERS, queue_sizes=PIPELINE_QUEUE_SIZES):
+    """
+    Streaming version of the pipeline: parse -> download -> decode -> infer run concurrently,
+    connected by bounded queues, so the first images reach the model while later pages are
+    still being parsed and downloaded. A full queue slows its upstream stage down.
+
+    Args:
+        data: List of HTML page dicts (domain_start_id, base_url, response_text)
+        moondream_processor: MoondreamProcessor
+        categories: List of categories to classify
+        batch_size: Images per model batch
+        on_progress: Optional callback on_progress(progress, partial_stats)
+        workers: Concurrency per stage ('parse', 'download', 'decode')
+        queue_sizes: Capacity of each queue ('urls', 'downloaded', 'decoded', 'batches')
+
+    Returns:
+        Consumer statistics, plus stage counters, pre-download filter counts and queue depths under 'pipeline'
+    """
+    queues = {name: asyncio.Queue(maxsize=size) for name, size in queue_sizes.items()}
+    counters = defaultdict(int)
+    monitor = QueueMonitor(queues)
+    monitor_task = asyncio.create_task(monitor.run())
+    cache = get_image_cache()
+    start = time.perf_counter()
+
+    def on_batch(stats):
+        if on_progress:
+            on_progress({'phase': 'streaming', 'processed_images': stats['total_images'], **counters}, stats)
+
+    pages = iter(data)
+    seen_urls = {}
+    filter_report = FilterReport()
+    # Pages are parsed on the shared parse process pool when it's enabled (it outlives this call)
+    if HTML_PARSE_PROCESSES > 1:
+        parse_pool = nullcontext(None)
+    else:
+        parse_pool = ThreadPoolExecutor(max_workers=workers['parse'])
+    with parse_pool as parse_executor, \
+            ThreadPoolExecutor(max_workers=workers['decode']) as decode_executor:
+        async with create_download_session(max_concurrency=workers['download']) as session:
+            tasks = [
+                asyncio.create_task(_run_stage(
+                    [parse_worker(pages, parse_executor, queues['urls'], seen_urls, counters, filter_report)
+                     for _ in range(workers['parse'])],
+                    queues['urls'], workers['download']
+                )),
+                asyncio.create_task(_run_stage(
+                    [download_worker(session, cache, queues['urls'], queues['downloaded'], counters, filter_report)
+                     for _ in range(workers['download'])],
+                    queues['downloaded'], workers['decode']
+                )),
+                asyncio.create_task(_run_stage(
+                    [decode_worker(decode_executor, queues['downloaded'], queues['decoded'], counters)
+                     for _ in range(workers['decode'])],
+                    queues['decoded'], 1
+                )),
+                asyncio.create_task(batcher(queues['decoded'], queues['batches'], batch_size)),
+            ]
+            consumer_task = asyncio.create_task(consumer(queues['batches'], moondream_processor, categories, on_batch))
+            try:
+                await asyncio.gather(*tasks, consumer_task)
+            except BaseException:
+                for task in tasks + [consumer_task]:
+                    task.cancel()
+                raise
+            finally:
+                monitor_task.cancel()
+
+    await asyncio.get_running_loop().run_in_executor(None, cache.evict)
+
+    stats = consumer_task.result()
+    stats['pipeline'] = {
+        'seconds': round(time.perf_counter() - start, 2),
+        'workers': dict(workers),
+        'counters': dict(counters),
+        'filtered': filter_report.as_dict(),
+        'queues': monitor.summary(),
+    }
+
+    print_summary(stats, moondream_processor)
+    queues = ", ".join(
+        f"{name} max {depth['max_depth']}/{depth['capacity']} mean {depth['mean_depth']}"
+        for name, depth in stats['pipeline']['queues'].items()
+    )
+    logging.info(f"Pipeline: stages {stats['pipeline']['counters']}, "
+                 f"pre-download filter {stats['pipeline']['filtered']}, queues {queues}")
+    return stats
+
+
+def process_domains_moondream_service(data, categories, on_progress=None):
     """
     data: List[Dict[str, Any]]
     categories: List[str]
+    on_progress: Optional callback on_progress(progress, partial_stats), used by background jobs
     """
-    # Collect and download images
-    image_data = collect_image_data(data)
-    download_images(image_data, TEMP_IMAGE_DIR)
-    
-    # Initialize image loader and processor
-    image_loader = ImageLoader(folder_path=TEMP_IMAGE_DIR, target_size=(512, 512), max_workers=8)
-    moondream = MoondreamProcessor()
+    moondream = get_model('moondream')
 
     # Get or create event loop
     try:
@@ -119,9 +352,15 @@ def process_domains_moondream_service(data, categories):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
     
-    # Launch the async pipeline
+    # Launch the streaming pipeline
     results = loop.run_until_complete(
-        process_domains_moondream(image_loader, moondream, categories, batch_size=2)
+        stream_domains_moondream(
+            data, moondream, categories,
+            batch_size=moondream.encode_batch_size,
+            on_progress=on_progress
+        )
     )
-    
+
+    # Results are computed, the request's temp files can go once they're old enough
+    maybe_collect_temp_garbage()
     return results
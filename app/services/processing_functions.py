@@ -1,7 +1,10 @@
-from ..core.image_models import MobileViTClassifier
+from ..core.model_registry import get_model
 from .extract_images import download_images_with_local_path, extract_img_attributes
+from .image_filters import FilterReport, filter_by_hints
 from collections import defaultdict
 from app.config import TEMP_IMAGE_DIR
+from app.loaders.loaders import IMAGE_EXTENSIONS
+from app.utils.temp_gc import maybe_collect_temp_garbage
 
 
 def process_html(html, base_url, model):
@@ -14,23 +17,25 @@ def process_html(html, base_url, model):
         model (MobileViTClassifier): Classification model.
 
     Returns:
-        dict: Contains predictions and statistics.
+        dict: Contains predictions, statistics and the counts of the pre-download filter.
     """
     html_results = {
         "predictions": [],
         "statistics": defaultdict(int)
     }
 
-    # Extract image attributes
-    img_data = extract_img_attributes(html, base_url)
+    # Extract image attributes; icons, sprites and tracking pixels are dropped by their HTML hints
+    filter_report = FilterReport()
+    img_data = filter_by_hints(extract_img_attributes(html, base_url), filter_report)
 
-    # Download images and update local paths
-    download_images_with_local_path(img_data, TEMP_IMAGE_DIR)
+    # Download images and update local paths (too small ones are aborted after their first bytes)
+    download_images_with_local_path(img_data, TEMP_IMAGE_DIR, probe=True, filter_report=filter_report)
+    html_results["filtered"] = filter_report.as_dict()
 
     # Classify downloaded images
     for img in img_data:
         if "local_path" in img and img["local_path"]:
-            if not any(img["local_path"].lower().endswith(ext) for ext in [".jpeg", ".jpg", ".png"]) and "logo" not in img["local_path"].lower():
+            if not img["local_path"].lower().endswith(IMAGE_EXTENSIONS) and "logo" not in img["local_path"].lower():
                 continue
 
             try:
@@ -42,7 +47,8 @@ def process_html(html, base_url, model):
                 html_results["statistics"][prediction] += 1
             except Exception as e:
                 print(f"Error classifying image {img['local_path']}: {e}")
-    
+
+    maybe_collect_temp_garbage()
     return html_results
 
 
@@ -66,7 +72,7 @@ def process_single_domain(domain_data, model):
 
 
 def process_domains(domains_data, output_type="detailed"):
-    model = MobileViTClassifier()
+    model = get_model('mobilevit_v2')
 
     detailed_results = []
     summary_stats = {
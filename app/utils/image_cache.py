@@ -0,0 +1,221 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Dict
+
+from app.config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_REVALIDATE_AFTER
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    sha256: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    path: str
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < IMAGE_CACHE_REVALIDATE_AFTER
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk image cache.
+
+    1. Image bytes are stored once per SHA-256 under blobs/<aa>/<sha256>.
+    2. A SQLite index maps every URL to its blob plus the ETag/Last-Modified
+       validators, so repeated URLs can be revalidated with a conditional GET.
+    3. Blobs are evicted least-recently-used first once the byte budget is exceeded.
+    """
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.sqlite3')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_urls_sha256 ON urls (sha256)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe across threads and worker processes.
+        # `with sqlite3.connect()` only commits, so the connection is closed explicitly.
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    @staticmethod
+    def local_name(domain_id, sha256: str, original_name: str) -> str:
+        """
+        Builds the request-facing filename of a cached image.
+        The domain id stays first (the Moondream stats group by it) and the hash prefix keeps
+        different images that share a basename from overwriting each other.
+        """
+        return f"{domain_id}_{sha256[:16]}_{original_name}"
+
+    @staticmethod
+    def content_key(filename: str) -> Optional[str]:
+        """Returns the content hash prefix embedded by local_name, or None for other files."""
+        parts = os.path.basename(filename).split('_', 2)
+        if len(parts) == 3 and len(parts[1]) == 16 and all(c in '0123456789abcdef' for c in parts[1]):
+            return parts[1]
+        return None
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Returns the cache entry for a URL if its blob is still on disk."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT sha256, etag, last_modified, fetched_at FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        path = self.blob_path(row[0])
+        if not os.path.exists(path):
+            return None
+        return CacheEntry(url, row[0], row[1], row[2], row[3], path)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """Builds the revalidation headers for a conditional GET."""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, url: str, content: bytes, etag: str = None, last_modified: str = None) -> str:
+        """
+        Stores downloaded bytes under their content hash and indexes the URL.
+
+        Returns:
+            str: The SHA-256 hex digest of the content.
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha256)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (sha256, size, last_access) VALUES (?, ?, ?)",
+                (sha256, len(content), now)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, sha256, etag, last_modified, now)
+            )
+        return sha256
+
+    def touch(self, entry: CacheEntry, revalidated: bool = False) -> None:
+        """Marks a cache hit; a successful revalidation also restarts the freshness window."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (now, entry.sha256))
+            if revalidated:
+                conn.execute("UPDATE urls SET fetched_at = ? WHERE url = ?", (now, entry.url))
+
+    def materialize(self, sha256: str, dest_path: str) -> str:
+        """
+        Exposes a cached blob at dest_path. Uses a hard link so no bytes are copied,
+        and falls back to a copy when the folders live on different filesystems.
+        """
+        if os.path.exists(dest_path):
+            return dest_path
+        try:
+            os.link(self.blob_path(sha256), dest_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(self.blob_path(sha256), dest_path)
+        return dest_path
+
+    def total_bytes(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self) -> int:
+        """
+        Deletes least-recently-used blobs until the cache fits in max_bytes.
+
+        Returns:
+            int: Number of blobs evicted.
+        """
+        evicted = 0
+        with self._lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+
+            rows = conn.execute("SELECT sha256, size FROM blobs ORDER BY last_access ASC").fetchall()
+            for sha256, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self.blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+                total -= size
+                evicted += 1
+
+        if evicted:
+            print(f"Evicted {evicted} images from cache ({total/1024/1024:.1f}MB left)")
+        return evicted
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Returns the process-wide image cache."""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = ImageCache()
+    return _image_cache
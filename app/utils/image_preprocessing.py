@@ -1,20 +1,46 @@
 from PIL import Image
+import io
 import base64
 import logging
+import threading
+from collections import OrderedDict
 
-def preprocess_image(image_path, target_size=(512, 512)):
+IMAGE_MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'png': 'image/png',
+}
+
+
+def preprocess_image(image_path, max_side=1024, grayscale=False):
     """
-    Preprocesses an image by resizing and converting it to grayscale.
+    Preprocesses an image for a hosted model: downscales it so its longest side is at most
+    max_side (keeping the aspect ratio) and converts it to RGB or grayscale.
     """
     try:
-        img = Image.open(image_path)
-        img = img.resize(target_size, Image.LANCZOS).convert("L")
-        return img #TODO this should return a path -> save to temp folder???
+        with Image.open(image_path) as img:
+            # JPEGs are downscaled while decoding, before the exact resize below
+            img.draft("L" if grayscale else "RGB", (max_side, max_side))
+            if img.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white; JPEG has no alpha channel
+                img = img.convert("RGBA")
+                background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+                img = Image.alpha_composite(background, img)
+            img = img.convert("L" if grayscale else "RGB")
+            img.thumbnail((max_side, max_side), Image.BICUBIC)
+            return img
     except Exception as e:
         logging.error(f"Error preprocessing image {image_path}: {e}")
         return None
 
 
+def encode_image(img, image_format='jpeg', quality=85):
+    """Encodes a PIL image to bytes in the given format ('jpeg', 'webp' or 'png')."""
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format.upper(), quality=quality)
+    return buffer.getvalue()
+
+
 def encode_image_to_base64(image_path):
     """
     Encodes an image to a base64 string.
@@ -25,16 +51,79 @@ def encode_image_to_base64(image_path):
     except Exception as e:
         logging.error(f"Error encoding image {image_path} to base64: {e}")
         return None
-    
 
-def prepare_image(image_path):
+
+class PayloadCache:
+    """In-memory LRU of prepared image payloads, bounded by their total size in bytes."""
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= len(self._data.pop(key))
+            self._data[key] = value
+            self.total_bytes += len(value)
+            while self.total_bytes > self.max_bytes and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+
+_payload_cache = None
+_payload_cache_lock = threading.Lock()
+
+
+def get_payload_cache():
+    """Returns the process-wide payload cache."""
+    # app.config imports the model classes, so read it lazily to avoid a circular import
+    from app.config import HOSTED_PAYLOAD_CACHE_MAX_BYTES
+
+    global _payload_cache
+    if _payload_cache is None:
+        with _payload_cache_lock:
+            if _payload_cache is None:
+                _payload_cache = PayloadCache(HOSTED_PAYLOAD_CACHE_MAX_BYTES)
+    return _payload_cache
+
+
+def prepare_image(image_path, max_side=1024, image_format='jpeg', quality=85, grayscale=False, image_hash=None):
     """
     Prepares an image by preprocessing and encoding it to base64.
-    
+
+    Args:
+        image_hash: Content hash of the file; when given, the payload is cached under it
+            together with the preprocessing options.
+
     Returns:
-        str: Base64 encoded image
+        str: Data URL with the matching MIME type (data:image/<format>;base64,...), or None
     """
-    # img = preprocess_image(image_path)
-    base64_image = encode_image_to_base64(image_path)
-    
-    return base64_image
\ No newline at end of file
+    cache_key = f"{image_hash}:{max_side}:{image_format}:{quality}:{int(grayscale)}" if image_hash else None
+    if cache_key:
+        cached = get_payload_cache().get(cache_key)
+        if cached is not None:
+            return cached
+
+    img = preprocess_image(image_path, max_side=max_side, grayscale=grayscale)
+    if img is None:
+        return None
+    base64_image = base64.b64encode(encode_image(img, image_format, quality)).decode('utf-8')
+    data_url = f"data:{IMAGE_MIME_TYPES[image_format]};base64,{base64_image}"
+
+    if cache_key:
+        get_payload_cache().set(cache_key, data_url)
+    return data_url
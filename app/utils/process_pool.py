@@ -0,0 +1,62 @@
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ForkedProcessPool:
+    """
+    A process-wide ProcessPoolExecutor whose workers are forked.
+
+    Forking copies the locks held by other threads at that moment (the interpreter's, the
+    allocator's, OpenMP's), so the workers should be forked before the process starts any:
+    servers call start() from gunicorn's post_worker_init hook (see start_process_pools).
+    Spawned or forkserver workers would avoid that, but every one of them would import the
+    app package, torch and the model code again.
+
+    A worker that dies breaks the whole executor; callers that get BrokenProcessPool reset()
+    it, and the next get() forks a new one.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self, max_workers: int) -> ProcessPoolExecutor:
+        """Creates the pool and forks all of its workers now, rather than on the first submit."""
+        pool = self.get(max_workers)
+        # Concurrent tasks make the executor fork every worker (it spawns on demand otherwise)
+        for future in [pool.submit(time.sleep, 0.05) for _ in range(max_workers)]:
+            future.result()
+        return pool
+
+    def get(self, max_workers: int) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=max_workers,
+                        mp_context=multiprocessing.get_context("fork")
+                    )
+        return self._pool
+
+    def reset(self, pool: ProcessPoolExecutor = None) -> None:
+        """Drops a broken pool (only if it is still the current one, when given)."""
+        with self._lock:
+            if self._pool is None or (pool is not None and pool is not self._pool):
+                return
+            broken, self._pool = self._pool, None
+        print(f"{self.name} process pool broke, a new one is forked on next use")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def start_process_pools() -> None:
+    """Forks the configured HTML parse and image decode pools while the process has no threads yet."""
+    from app.config import HTML_PARSE_PROCESSES, IMAGE_DECODE_PROCESSES
+    from app.services.html_parser import PARSE_PROCESS_POOL
+    from app.loaders.shared_decoding import DECODE_PROCESS_POOL
+
+    if HTML_PARSE_PROCESSES > 1:
+        PARSE_PROCESS_POOL.start(HTML_PARSE_PROCESSES)
+    if IMAGE_DECODE_PROCESSES:
+        DECODE_PROCESS_POOL.start(IMAGE_DECODE_PROCESSES)
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+
+from app.config import (
+    TEMP_IMAGE_DIR,
+    TEMP_GC_MAX_AGE,
+    TEMP_GC_MIN_AGE,
+    TEMP_GC_MAX_BYTES,
+    TEMP_GC_INTERVAL,
+)
+
+
+def collect_temp_garbage(folder=TEMP_IMAGE_DIR,
+                         max_age=TEMP_GC_MAX_AGE,
+                         max_bytes=TEMP_GC_MAX_BYTES,
+                         min_age=TEMP_GC_MIN_AGE) -> dict:
+    """
+    Deletes request files from the temp folder.
+
+    1. Files older than max_age are deleted.
+    2. If the remaining files still hold more than max_bytes, the oldest are deleted first,
+       but never files younger than min_age, which may belong to a running request.
+
+    Hard links into the image cache hold no bytes of their own (the cache keeps its copy),
+    so only files with a single link count towards max_bytes.
+
+    Returns:
+        dict: Number of deleted files and freed bytes
+    """
+    now = time.time()
+    files = []
+    for entry in os.scandir(folder):
+        try:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        # Linking a cached blob updates ctime but keeps the blob's old mtime
+        age = now - max(stat.st_mtime, stat.st_ctime)
+        own_bytes = stat.st_size if stat.st_nlink == 1 else 0
+        files.append((age, own_bytes, entry.path))
+
+    deleted, freed = 0, 0
+
+    def delete(path, own_bytes):
+        nonlocal deleted, freed
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        deleted += 1
+        freed += own_bytes
+
+    # Oldest first
+    files.sort(reverse=True)
+    remaining = []
+    for age, own_bytes, path in files:
+        if age > max_age:
+            delete(path, own_bytes)
+        else:
+            remaining.append((age, own_bytes, path))
+
+    total = sum(own_bytes for _, own_bytes, _ in remaining)
+    for age, own_bytes, path in remaining:
+        if total <= max_bytes or age < min_age:
+            break
+        if own_bytes:
+            delete(path, own_bytes)
+            total -= own_bytes
+
+    if deleted:
+        print(f"Temp GC: deleted {deleted} files ({freed/1024/1024:.1f}MB) from {folder}")
+    return {'deleted_files': deleted, 'freed_bytes': freed}
+
+
+_last_run = 0.0
+_gc_lock = threading.Lock()
+
+
+def maybe_collect_temp_garbage(folder=TEMP_IMAGE_DIR, interval=TEMP_GC_INTERVAL):
+    """Runs collect_temp_garbage at most once per interval; cheap to call after every request."""
+    global _last_run
+    with _gc_lock:
+        if time.time() - _last_run < interval:
+            return None
+        _last_run = time.time()
+    return collect_temp_garbage(folder)
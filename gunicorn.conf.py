@@ -0,0 +1,77 @@
+# Production server config: gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# On CPU nodes the app is created (and the models in PRELOAD_MODELS loaded) once in the master
+# and the workers are forked from it, so they share the weights copy-on-write instead of
+# each loading its own copy of Moondream.
+# CUDA can't be initialized before a fork, so on GPU nodes the models load in a single
+# worker and requests are served by its threads (the GPU is shared through threads anyway).
+
+import gc
+import os
+import shutil
+import subprocess
+
+
+def _has_gpu():
+    """
+    GUNICORN_GPU=1/0 decides explicitly. Otherwise asks nvidia-smi for a device: the CUDA base
+    image sets NVIDIA_VISIBLE_DEVICES=all even on CPU hosts, and importing torch here would
+    put it in the master before the fork.
+    """
+    setting = os.getenv('GUNICORN_GPU', '').strip().lower()
+    if setting:
+        return setting in ('1', 'true', 'yes')
+    if not shutil.which('nvidia-smi'):
+        return False
+    try:
+        result = subprocess.run(['nvidia-smi', '-L'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0 and 'GPU' in result.stdout
+
+
+GPU = _has_gpu()
+CPU_COUNT = os.cpu_count() or 1
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', 1 if GPU else max(1, CPU_COUNT // 2)))
+threads = int(os.getenv('GUNICORN_THREADS', 8 if GPU else 4))
+preload_app = os.getenv('GUNICORN_PRELOAD', '0' if GPU else '1') == '1'
+
+# Domain batches run inference inside the request, so allow long requests
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 600))
+graceful_timeout = 60
+
+os.environ.setdefault('PRELOAD_MODELS', 'mobilevit_v2,moondream')
+
+# Torch intra-op threads per worker, so the workers together use each core once
+TORCH_THREADS = max(1, CPU_COUNT // workers)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far into the permanent generation, so the garbage collector
+    # doesn't touch (and copy) the preloaded objects' pages in every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+    from app.core.model_registry import MODEL_REGISTRY
+
+    if MODEL_REGISTRY.is_loaded('moondream'):
+        MODEL_REGISTRY.get('moondream').executor.set_torch_threads(TORCH_THREADS)
+    else:
+        torch.set_num_threads(TORCH_THREADS)
+    server.log.info(f"Worker {worker.pid}: {TORCH_THREADS} torch threads")
+
+
+def post_worker_init(worker):
+    # The app is loaded but the worker hasn't started its request threads yet: fork the
+    # decode/parse process pools now, so they can't inherit a lock another thread holds
+    from app.utils.process_pool import start_process_pools
+    from app.services.jobs import get_job_manager
+
+    start_process_pools()
+    # Also fails the jobs a previous worker with this pid left queued or running
+    get_job_manager()
@@ -0,0 +1,88 @@
+## Benchmark: image decode + resize throughput (images per second on one core)
+
+import argparse
+import time
+
+import os
+import sys
+# Get the absolute path to the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+from app.loaders import ImageLoader
+from app.loaders.decoding import decode_image, decoder_info, cv2
+
+
+def decode_baseline(image_path, target_size):
+    """The previous path: full-resolution decode, then LANCZOS."""
+    with Image.open(image_path) as img:
+        return img.convert("RGB").resize(target_size, Image.LANCZOS)
+
+
+def time_variant(decode, image_paths, target_size, repeats):
+    # One thread on purpose: the result is images per second per core
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for image_path in image_paths:
+            decode(image_path, target_size)
+        timings.append(time.perf_counter() - start)
+    return len(image_paths) / min(timings)
+
+
+def time_loader(image_paths, target_size, workers, decode_processes):
+    """Whole-loader throughput: threads vs. worker processes returning pixels via shared memory."""
+    image_loader = ImageLoader(image_paths=image_paths, target_size=target_size, max_workers=workers,
+                               decode_processes=decode_processes)
+    # Warm up, so process start-up isn't timed
+    next(ImageLoader(image_paths=image_paths[:workers], target_size=target_size, max_workers=workers,
+                     decode_processes=decode_processes).batch_images(batch_size=workers))
+    start = time.perf_counter()
+    n_images = sum(len(filenames) for filenames, _ in image_loader.batch_images(batch_size=16))
+    return n_images / (time.perf_counter() - start)
+
+
+def main(image_folder, limit, repeats, target_size, workers):
+    image_paths = sorted(
+        os.path.join(image_folder, f) for f in os.listdir(image_folder)
+        if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )[:limit]
+    if not image_paths:
+        print(f"No images in {image_folder}")
+        return
+
+    variants = {
+        'baseline (full decode, lanczos)': decode_baseline,
+        'pil draft + lanczos': lambda path, size: decode_image(path, size, backend='pil', resample='lanczos'),
+        'pil draft + bilinear': lambda path, size: decode_image(path, size, backend='pil', resample='bilinear'),
+    }
+    if cv2 is not None:
+        cv2.setNumThreads(1)
+        variants['opencv reduced + area'] = lambda path, size: decode_image(path, size, backend='opencv')
+
+    print(f"Decoders: {decoder_info()}")
+    print(f"{len(image_paths)} images, target size {target_size}, best of {repeats}\n")
+    print(f"{'variant':<34} {'img/s/core':>10} {'speedup':>8}")
+    baseline = None
+    for name, decode in variants.items():
+        images_per_second = time_variant(decode, image_paths, target_size, repeats)
+        baseline = baseline or images_per_second
+        print(f"{name:<34} {images_per_second:>10.1f} {images_per_second / baseline:>7.2f}x")
+
+    print(f"\n{'pool (' + str(workers) + ' workers)':<34} {'img/s':>10}")
+    print(f"{'threads':<34} {time_loader(image_paths, target_size, workers, 0):>10.1f}")
+    print(f"{'processes + shared memory':<34} {time_loader(image_paths, target_size, workers, workers):>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folder", default="data/images/test_set")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    main(args.folder, args.limit, args.repeats, (args.size, args.size), args.workers)
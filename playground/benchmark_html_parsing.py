@@ -0,0 +1,123 @@
+## Benchmark: <img> extraction with BeautifulSoup vs. the lxml target parser vs. selectolax
+##
+## Pages come from data/HTML_data.parquet (written by app.utils.data_tool.load_and_save_html_data)
+## or, if that doesn't exist, from the *.html files under data/.
+##
+## Before timing, every engine must return the same entries for FIXTURE_PAGE
+## (--check-only runs just that check).
+
+import argparse
+import glob
+import time
+
+import os
+import sys
+# Get the absolute path to the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from app.services.html_parser import PARSER_ENGINES, LexborHTMLParser, parse_img_tags, get_parse_cache
+
+
+# <img> tags, a <picture> with <source>s, srcset, and CSS backgrounds in style attributes and a <style> block
+FIXTURE_PAGE = """<!DOCTYPE html>
+<html><head><style>.hero { background-image: url('/img/hero.jpg'); }</style></head>
+<body>
+<div class="banner" style="background: #fff url(/img/banner.png) no-repeat">
+  <img src="/img/a.jpg" alt="A photo" class="photo wide" width="640" height="480">
+</div>
+<picture>
+  <source srcset="/img/b-800.webp 800w, /img/b-1600.webp 1600w" type="image/webp" class="art">
+  <source srcset="/img/b-800.jpg 800w">
+  <img src="/img/b.jpg" alt="B">
+</picture>
+<p><img src="/img/c.png" srcset="/img/c.png 1x, /img/c@2x.png 2x"></p>
+<span style="background-image: url(&quot;/img/quoted.gif&quot;)"></span>
+</body></html>"""
+
+
+def check_engines(engines):
+    """True if every engine returns the same entries as bs4 for FIXTURE_PAGE; prints the differences."""
+    reference = PARSER_ENGINES['bs4'](FIXTURE_PAGE)
+    consistent = True
+    for engine in engines:
+        entries = PARSER_ENGINES[engine](FIXTURE_PAGE)
+        if entries != reference:
+            consistent = False
+            print(f"{engine} differs from bs4 on the fixture page:\n  {engine}: {entries}\n  bs4: {reference}")
+    if consistent:
+        print(f"{', '.join(engines)}: same {len(reference)} entries on the fixture page\n")
+    return consistent
+
+
+def load_pages(data_dir, limit):
+    parquet_path = os.path.join(data_dir, 'HTML_data.parquet')
+    if os.path.exists(parquet_path):
+        import pandas as pd
+        df = pd.read_parquet(parquet_path, columns=['response_text'])
+        return [html for html in df['response_text'].head(limit) if isinstance(html, str)]
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(data_dir, '**', '*.html'), recursive=True))[:limit]:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+    return pages
+
+
+def time_engine(parse, pages, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for html in pages:
+            parse(html)
+        timings.append(time.perf_counter() - start)
+    return len(pages) / min(timings)
+
+
+def main(data_dir, limit, repeats, check_only=False):
+    engines = [engine for engine in PARSER_ENGINES if engine != 'selectolax' or LexborHTMLParser is not None]
+    if not check_engines(engines):
+        sys.exit(1)
+    if check_only:
+        return
+
+    pages = load_pages(data_dir, limit)
+    if not pages:
+        print(f"No pages found in {data_dir} (expected HTML_data.parquet or *.html files)")
+        return
+    megabytes = sum(len(html) for html in pages) / 1024 / 1024
+    print(f"{len(pages)} pages ({megabytes:.1f}MB), {len(set(pages))} distinct, best of {repeats}\n")
+
+    # Same <img> src lists as BeautifulSoup?
+    reference = [[img.get('src') for img in PARSER_ENGINES['bs4'](html)] for html in pages]
+    print(f"{'engine':<22} {'pages/s':>9} {'MB/s':>7} {'speedup':>8} {'same srcs':>10}")
+    baseline = None
+    for engine in engines:
+        parse = PARSER_ENGINES[engine]
+        pages_per_second = time_engine(parse, pages, repeats)
+        baseline = baseline or pages_per_second
+        matching = sum(
+            [img.get('src') for img in parse(html)] == srcs for html, srcs in zip(pages, reference)
+        )
+        print(f"{engine:<22} {pages_per_second:>9.1f} {pages_per_second * megabytes / len(pages):>7.1f} "
+              f"{pages_per_second / baseline:>7.2f}x {matching:>5}/{len(pages)}")
+
+    # Whole crawl through the parse cache: repeated pages are only hashed
+    cache = get_parse_cache()
+    start = time.perf_counter()
+    for html in pages:
+        parse_img_tags(html, 'lxml')
+    elapsed = time.perf_counter() - start
+    print(f"{'lxml + parse cache':<22} {len(pages) / elapsed:>9.1f} {megabytes / elapsed:>7.1f} "
+          f"{len(pages) / elapsed / baseline:>7.2f}x   {cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--check-only", action="store_true", help="only compare the engines on the fixture page")
+    args = parser.parse_args()
+
+    main(args.data_dir, args.limit, args.repeats, args.check_only)
@@ -0,0 +1,54 @@
+## Benchmark: batched vision encoding vs. one encode_image call per image
+
+import asyncio
+import argparse
+import time
+
+import os
+import sys
+# Get the absolute path to the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from app.core.image_models import MoondreamProcessor
+from app.loaders import ImageLoader
+
+
+async def time_encoder(encode, batches, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for batch in batches:
+            await encode(batch)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def main(image_folder, batch_sizes, repeats):
+    image_loader = ImageLoader(folder_path=image_folder, target_size=(512, 512), max_workers=8)
+    moondream = MoondreamProcessor()
+    print(f"Device: {moondream.device}, default encode batch size: {moondream.encode_batch_size}")
+
+    # Warm up kernels and allocator before timing
+    warmup = next(image_loader.batch_images(batch_size=1))
+    await moondream._encode_images_in_batch(warmup)
+
+    print(f"\n{'batch':>6} {'per-image (img/s)':>18} {'batched (img/s)':>16} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        moondream.encode_batch_size = batch_size
+        batches = list(image_loader.batch_images(batch_size=batch_size))
+        n_images = sum(len(filenames) for filenames, _ in batches)
+
+        per_image = await time_encoder(moondream._encode_images_per_image, batches, repeats)
+        batched = await time_encoder(moondream._encode_images_in_batch, batches, repeats)
+        print(f"{batch_size:>6} {n_images / per_image:>18.2f} {n_images / batched:>16.2f} {per_image / batched:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image-folder", default="data/images/test_set")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.image_folder, args.batch_sizes, args.repeats))
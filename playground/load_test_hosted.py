@@ -0,0 +1,120 @@
+## Load test: AsyncVisionLanguageModelClassifier.predict_batch against the local mock VLM server.
+##
+##   python playground/mock_vlm_server.py --port 8001 --capacity 32 --rate-limit-rate 0.01 &
+##   python playground/load_test_hosted.py --api-base http://localhost:8001/v1 --images 300 --concurrency 1 4 16 adaptive
+##
+## Reports throughput and request latency percentiles for every concurrency setting.
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Get the absolute path to the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import litellm
+from PIL import Image
+
+from app.core.image_models import AsyncVisionLanguageModelClassifier
+from app.core.request_scheduler import RequestScheduler
+from app.core.result_cache import ResultCache, MemoryResultBackend
+from app.utils.image_preprocessing import get_payload_cache
+
+
+def make_images(folder, n_images, size=(800, 600)):
+    """Random noise JPEGs, each distinct so no cache short-circuits a request."""
+    paths = []
+    for i in range(n_images):
+        path = os.path.join(folder, f"load_{i}.jpg")
+        Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(path, quality=80)
+        paths.append(path)
+    return paths
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run_setting(image_paths, categories, concurrency, images_per_request, requests_per_second):
+    classifier = AsyncVisionLanguageModelClassifier(model_name="openai/mock-vlm")
+    # Fresh caches and scheduler per run, so runs don't influence each other: the process-wide
+    # payload cache would otherwise skip the image encoding for every run after the first
+    classifier.result_cache = ResultCache(MemoryResultBackend())
+    get_payload_cache().clear()
+    if concurrency == "adaptive":
+        classifier.scheduler = RequestScheduler(requests_per_second=requests_per_second, burst=requests_per_second)
+    else:
+        classifier.scheduler = RequestScheduler(
+            requests_per_second=requests_per_second, burst=requests_per_second,
+            initial_concurrency=concurrency, min_concurrency=concurrency, max_concurrency=concurrency
+        )
+
+    latencies = []
+    acompletion = litellm.acompletion
+
+    async def timed_acompletion(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await acompletion(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started_at)
+
+    litellm.acompletion = timed_acompletion
+    try:
+        start = time.perf_counter()
+        results = await classifier.predict_batch(image_paths, categories=categories, images_per_request=images_per_request)
+        elapsed = time.perf_counter() - start
+    finally:
+        litellm.acompletion = acompletion
+
+    failed = sum(result["prediction"] is None for result in results)
+    stats = classifier.scheduler.stats()
+    return {
+        "setting": str(concurrency),
+        "images_per_second": len(image_paths) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "requests": len(latencies),
+        "retries": stats["retries"],
+        "rate_limited": stats["rate_limited"],
+        "failed": failed,
+        "final_limit": stats["limit"],
+    }
+
+
+async def main(args):
+    litellm.api_base = args.api_base
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as folder:
+        image_paths = make_images(folder, args.images)
+        print(f"{args.images} images, {args.images_per_request} per request, categories: {args.categories}\n")
+        print(f"{'concurrency':>11} {'img/s':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} "
+              f"{'requests':>8} {'retries':>7} {'429s':>5} {'failed':>6} {'limit':>6}")
+        for setting in args.concurrency:
+            concurrency = setting if setting == "adaptive" else int(setting)
+            row = await run_setting(image_paths, args.categories, concurrency, args.images_per_request, args.rps)
+            print(f"{row['setting']:>11} {row['images_per_second']:>7.1f} {row['p50']:>8.2f} {row['p95']:>8.2f} "
+                  f"{row['p99']:>8.2f} {row['requests']:>8} {row['retries']:>7} {row['rate_limited']:>5} "
+                  f"{row['failed']:>6} {row['final_limit']:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api-base", default="http://localhost:8001/v1")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--images-per-request", type=int, default=1)
+    parser.add_argument("--categories", nargs="*", default=["shoes", "bags", "furniture"])
+    parser.add_argument("--concurrency", nargs="+", default=["1", "4", "16", "64", "adaptive"])
+    parser.add_argument("--rps", type=int, default=1000, help="token bucket rate for the runs")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
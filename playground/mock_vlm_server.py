@@ -0,0 +1,131 @@
+## Local OpenAI-compatible stand-in for a hosted VLM, to benchmark the hosted pipeline for free.
+##
+##   python playground/mock_vlm_server.py --port 8001 --latency-median 0.8 --rate-limit-rate 0.02
+##
+## Point litellm at it with model "openai/mock-vlm" and api_base "http://localhost:8001/v1"
+## (see playground/load_test_hosted.py).
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from aiohttp import web
+
+
+def parse_categories(prompt):
+    """Reads the category list out of ImagePrompts.get_categorized_prompt / get_packed_prompt."""
+    match = re.search(r"following categories: (.*?)\.\s*\n", prompt)
+    return [category.strip() for category in match.group(1).split(",")] if match else []
+
+
+def canned_answer(categories, rng):
+    if not categories:
+        return {"prediction": rng.choice(["product", "person", "food", "furniture", "logo"])}
+    answer = {"categories": {category: rng.random() < 0.3 for category in categories}}
+    if not any(answer["categories"].values()):
+        answer["custom_category"] = rng.choice(["product", "person", "landscape"])
+    return answer
+
+
+class MockVLM:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.in_flight = 0
+        self.counters = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "malformed": 0}
+
+    def latency(self, n_images):
+        # Lognormal around the median, plus per-image cost for packed requests
+        latency = self.rng.lognormvariate(0, self.args.latency_sigma) * self.args.latency_median
+        return latency + self.args.latency_per_image * (n_images - 1)
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        self.counters["requests"] += 1
+
+        if self.in_flight >= self.args.capacity or self.rng.random() < self.args.rate_limit_rate:
+            self.counters["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                status=429, headers={"Retry-After": str(self.args.retry_after)}
+            )
+
+        content = body["messages"][-1]["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        prompt = next((part["text"] for part in content if part["type"] == "text"), "")
+        n_images = sum(part["type"] == "image_url" for part in content)
+        image_chars = sum(len(part["image_url"]["url"]) for part in content if part["type"] == "image_url")
+
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency(max(1, n_images)))
+        finally:
+            self.in_flight -= 1
+
+        if self.rng.random() < self.args.error_rate:
+            self.counters["errors"] += 1
+            return web.json_response({"error": {"message": "Internal error", "type": "server_error"}}, status=500)
+
+        categories = parse_categories(prompt)
+        if self.rng.random() < self.args.malformed_rate:
+            self.counters["malformed"] += 1
+            text = "I think the image shows " + ", ".join(categories or ["something"])
+        elif n_images > 1:
+            text = json.dumps([{"image_index": i, **canned_answer(categories, self.rng)} for i in range(n_images)])
+        else:
+            text = "```json\n" + json.dumps(canned_answer(categories, self.rng)) + "\n```"
+
+        self.counters["ok"] += 1
+        # Rough token counts: ~4 characters per text token, a fixed cost per image
+        prompt_tokens = len(prompt) // 4 + 85 * n_images
+        completion_tokens = len(text) // 4
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-vlm"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "mock": {"upload_bytes": image_chars},
+        })
+
+    async def models(self, request):
+        return web.json_response({"object": "list", "data": [{"id": "mock-vlm", "object": "model"}]})
+
+    async def stats(self, request):
+        return web.json_response({**self.counters, "in_flight": self.in_flight})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-median", type=float, default=0.8, help="seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="lognormal shape, 0 = constant")
+    parser.add_argument("--latency-per-image", type=float, default=0.15, help="extra seconds per additional packed image")
+    parser.add_argument("--capacity", type=int, default=32, help="requests in flight before everything gets a 429")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of random 429s")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500s")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of answers that aren't JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockVLM(args)
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", mock.chat_completions)
+    app.router.add_get("/v1/models", mock.models)
+    app.router.add_get("/stats", mock.stats)
+    web.run_app(app, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 from app.core.image_models import MobileViTClassifier, AsyncVisionLanguageModelClassifier
 from app.config import TEMP_IMAGE_DIR
 from app.loaders import ImageLoader
-from app.services.extract_images import download_images, collect_image_data
+from app.services.extract_images import download_all_images_async, collect_image_data
 
 
 class ModelLoader:
@@ -32,7 +32,6 @@ async def producer_local(image_loader: ImageLoader, queue: asyncio.Queue, batch_
     """
     Produces batches of images from the ImageLoader.
     """
-    image_loader = ImageLoader(folder_path=TEMP_IMAGE_DIR, target_size=(512, 512), max_workers=8)
     for batch in image_loader.batch_images(batch_size):
         await queue.put(batch)
     # Signal completion
@@ -65,12 +64,14 @@ async def consumer_local(queue: asyncio.Queue, model):
     return results
 
 
-async def process_images_local(categories:list[str]=None, batch_size: int = 8):
+async def process_images_local(data_list: List[Dict[str, Any]], categories:list[str]=None, batch_size: int = 8):
     """
     Main processing function that sets up and runs the producer-consumer pattern.
     """
-    # Initialize image loader
-    image_loader = ImageLoader(TEMP_IMAGE_DIR, target_size=(512, 512))
+    # Collect and download images; the loader only sees this run's downloads
+    image_data = collect_image_data(data_list['data'])
+    downloaded_images = await download_all_images_async(image_data, TEMP_IMAGE_DIR)
+    image_loader = ImageLoader.from_downloads(downloaded_images, target_size=(512, 512), max_workers=8)
     
     # Initialize queue
     queue = asyncio.Queue()
@@ -100,7 +101,7 @@ async def process_images_hosted(data_list: List[Dict[str, Any]], categories: Lis
     
     # Collect and download images
     image_data = collect_image_data(data_list['data'])
-    downloaded_images = download_images(image_data, TEMP_IMAGE_DIR)
+    downloaded_images = await download_all_images_async(image_data, TEMP_IMAGE_DIR)
     
     # Process images with specified model
     model = ModelLoader(model_type="hosted")